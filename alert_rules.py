@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+import socket
+import threading
+
+from resilience import state_file, file_lock
+from balance_parser import CURRENCIES, MAIN_CURRENCY, format_amount
+
+logger = logging.getLogger(__name__)
+
+RULE_TYPES = ('threshold', 'change')
+TRIGGERS = ('crossing', 'level')
+
+NUMERIC_FIELDS = ('above', 'below', 'percent', 'hysteresis', 'cooldown')
+
+# Caracteres que no van en el nombre del archivo de estado de una cuenta
+UNSAFE_NAME_RE = re.compile(r'[^\w.-]')
+
+def validate_rule(rule):
+    """Valida una regla y devuelve una copia con los campos numéricos convertidos a float"""
+    if not isinstance(rule, dict):
+        raise ValueError(f"Alert rule must be a JSON object: {rule!r}")
+    rule_id = rule.get('id')
+    if not rule_id or not isinstance(rule_id, str):
+        raise ValueError(f"Alert rule without id: {rule}")
+    rule = dict(rule)
+    for field in NUMERIC_FIELDS:
+        if field not in rule:
+            continue
+        value = rule[field]
+        try:
+            number = float(value) if not isinstance(value, bool) else math.nan
+        except (TypeError, ValueError):
+            number = math.nan
+        if not math.isfinite(number):
+            raise ValueError(f"Rule '{rule_id}': {field} must be a number, got {value!r}")
+        rule[field] = number
+    for field in ('hysteresis', 'cooldown', 'percent'):
+        if rule.get(field, 0) < 0:
+            raise ValueError(f"Rule '{rule_id}': {field} cannot be negative")
+    if 'account' in rule and not isinstance(rule['account'], str):
+        raise ValueError(f"Rule '{rule_id}': account must be a string")
+    if rule.get('type', 'threshold') not in RULE_TYPES:
+        raise ValueError(f"Rule '{rule_id}': type must be one of {', '.join(RULE_TYPES)}")
+    if rule.get('scope', 'total') not in ('total', 'account'):
+        raise ValueError(f"Rule '{rule_id}': scope must be 'total' or 'account'")
+    if 'currency' in rule and rule['currency'] not in set(CURRENCIES.values()):
+        raise ValueError(f"Rule '{rule_id}': currency must be one of {', '.join(sorted(set(CURRENCIES.values())))}")
+    if rule.get('trigger', 'crossing') not in TRIGGERS:
+        raise ValueError(f"Rule '{rule_id}': trigger must be one of {', '.join(TRIGGERS)}")
+    if rule.get('type', 'threshold') == 'threshold':
+        if ('above' in rule) == ('below' in rule):
+            raise ValueError(f"Rule '{rule_id}': threshold rules need exactly one of 'above' or 'below'")
+    elif 'percent' not in rule:
+        raise ValueError(f"Rule '{rule_id}': change rules need 'percent'")
+    return rule
+
+def load_rules(path):
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError("Alert rules file must contain a JSON list")
+    return [validate_rule(rule) for rule in rules]
+
+def default_rules(threshold_amount):
+    """Equivalente a la regla histórica (total > THRESHOLD_AMOUNT), pero solo al cruzar el límite"""
+    return [{
+        'id': 'total_above_threshold',
+        'type': 'threshold',
+        'scope': 'total',
+        'above': threshold_amount,
+        'trigger': 'crossing',
+        'hysteresis': float(os.getenv('ALERT_HYSTERESIS', '0')),
+        'cooldown': float(os.getenv('ALERT_COOLDOWN', '0')),
+    }]
+
+class AlertEngine:
+    """Evalúa cada lectura contra el estado guardado de cada regla
+    
+    El estado se guarda en un archivo por cuenta (state_path para la cuenta única), así cada lectura
+    lee y reescribe solo las reglas de su cuenta, no las de todas.
+    """
+    
+    def __init__(self, state_path=''):
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        # Sin state_path el estado de cada cuenta queda en memoria
+        self._states = {}
+    
+    def path_for(self, profile):
+        if not self.state_path or not profile:
+            return self.state_path
+        base, ext = os.path.splitext(self.state_path)
+        return f"{base}.{UNSAFE_NAME_RE.sub('_', profile)}{ext or '.json'}"
+    
+    def evaluate(self, profile, balance_data, rules, now=None):
+        """Devuelve (alertas disparadas, estado nuevo de la cuenta); el estado se guarda recién con commit()
+        
+        Si la notificación no se pudo encolar no se llama a commit(): la próxima lectura vuelve a
+        disparar las mismas alertas en lugar de darlas por notificadas.
+        """
+        now = time.time() if now is None else now
+        alerts = []
+        # El estado se relee bajo el lock del archivo: con varios nodos, el que toma la cuenta tras un
+        # traspaso ve los cruces ya notificados por el anterior y no repite el email
+        with self._lock, file_lock(self.path_for(profile)):
+            states = self._load(profile)
+        for rule in rules:
+            for subject, value, currency in self._subjects(rule, balance_data):
+                key = f"{profile}|{rule['id']}|{subject}"
+                state = states.setdefault(key, {'active': False, 'last_value': None, 'last_fired': None})
+                message = self._apply(rule, state, subject, value, currency, now)
+                if message:
+                    alerts.append({'rule': rule['id'], 'subject': subject, 'value': value, 'message': message})
+        return alerts, states
+    
+    def commit(self, profile, states):
+        """Guarda el estado que devolvió evaluate() una vez encoladas sus alertas"""
+        with self._lock, file_lock(self.path_for(profile)):
+            self._save(profile, states)
+    
+    def _subjects(self, rule, balance_data):
+        if rule.get('scope', 'total') == 'total':
+            # Un total por moneda: nunca se comparan pesos y dólares sumados contra un mismo límite
+            currency = rule.get('currency', MAIN_CURRENCY)
+            if currency not in balance_data['totals']:
+                return []
+            subject = 'total' if currency == MAIN_CURRENCY else f"total {currency}"
+            return [(subject, balance_data['totals'][currency], currency)]
+        accounts = balance_data['accounts']
+        if rule.get('account'):
+            accounts = [a for a in accounts if a['name'] == rule['account']]
+        if rule.get('currency'):
+            accounts = [a for a in accounts if a['currency'] == rule['currency']]
+        return [(account['name'], account['balance'], account['currency']) for account in accounts]
+    
+    def _apply(self, rule, state, subject, value, currency, now):
+        if rule.get('type', 'threshold') == 'threshold':
+            message = self._apply_threshold(rule, state, subject, value, currency)
+        else:
+            message = self._apply_change(rule, state, subject, value, currency)
+        state['last_value'] = value
+        
+        if not message:
+            return None
+        cooldown = float(rule.get('cooldown', 0))
+        if state['last_fired'] is not None and now - state['last_fired'] < cooldown:
+            logger.info(f"Alert '{rule['id']}' for {subject} suppressed by cooldown")
+            return None
+        state['last_fired'] = now
+        return message
+    
+    def _apply_threshold(self, rule, state, subject, value, currency):
+        hysteresis = float(rule.get('hysteresis', 0))
+        if 'above' in rule:
+            limit = float(rule['above'])
+            in_alert = value > limit
+            # Histéresis: se rearma solo al volver por debajo de limit - hysteresis
+            cleared = value < limit - hysteresis
+            description = f"{subject}: {format_amount(value, currency)} supera el límite de {format_amount(limit, currency)}"
+        else:
+            limit = float(rule['below'])
+            in_alert = value < limit
+            cleared = value > limit + hysteresis
+            description = f"{subject}: {format_amount(value, currency)} está por debajo del límite de {format_amount(limit, currency)}"
+        
+        was_active = state['active']
+        if in_alert:
+            state['active'] = True
+        elif cleared:
+            state['active'] = False
+        
+        if rule.get('trigger', 'crossing') == 'level':
+            return description if in_alert else None
+        return description if in_alert and not was_active else None
+    
+    def _apply_change(self, rule, state, subject, value, currency):
+        previous = state['last_value']
+        if previous is None or previous == 0:
+            return None
+        change = (value - previous) / abs(previous) * 100
+        direction = rule.get('direction', 'any')
+        if direction == 'up' and change < 0 or direction == 'down' and change > 0:
+            return None
+        if abs(change) < float(rule['percent']):
+            return None
+        return f"{subject}: cambió {change:+.1f}% ({format_amount(previous, currency)} -> {format_amount(value, currency)})"
+    
+    def _load(self, profile):
+        """Copia del estado de la cuenta: evaluate() la modifica sin tocar lo guardado"""
+        if not self.state_path:
+            return {key: dict(state) for key, state in self._states.get(profile, {}).items()}
+        path = self.path_for(profile)
+        if not os.path.exists(path):
+            if path == self.state_path or not os.path.exists(self.state_path):
+                return {}
+            # Estado de antes del archivo por cuenta: todas las cuentas juntas en state_path
+            path = self.state_path
+        try:
+            with open(path, encoding='utf-8') as f:
+                states = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable alert state {path}: {str(e)}")
+            return {}
+        return {key: state for key, state in states.items() if key.startswith(f"{profile}|")}
+    
+    def _save(self, profile, states):
+        if not self.state_path:
+            self._states[profile] = states
+            return
+        path = self.path_for(profile)
+        tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(states, f)
+        os.replace(tmp_path, path)
+
+_alert_engine = None
+_alert_engine_lock = threading.Lock()
+
+def get_alert_engine():
+    global _alert_engine
+    with _alert_engine_lock:
+        if _alert_engine is None:
+            _alert_engine = AlertEngine(state_file('ALERT_STATE_FILE', 'alert_state.json'))
+    return _alert_engine
@@ -0,0 +1,216 @@
+import json
+import time
+import signal
+import asyncio
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import get_metrics
+from history_store import get_history
+from notification_outbox import get_outbox
+from scheduler import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+def isoformat(ts):
+    return datetime.fromtimestamp(ts).isoformat(timespec='seconds') if ts else None
+
+class AsyncDaemon:
+    """Orquestador asyncio: los ciclos de Selenium corren en un executor y SIGTERM espera al ciclo en curso"""
+    
+    def __init__(self, cycle, close, scheduler, status_port=0, status_host='127.0.0.1', health_max_age=0,
+                 drain_timeout=30, maintenance_interval=60, maintenance=None, reload=None):
+        # cycle(): ejecuta un ciclo bloqueante y devuelve {cuenta: totales por moneda o None}
+        self.cycle = cycle
+        self.close = close
+        # maintenance(): tarea periódica adicional (p. ej. el heartbeat del nodo)
+        self.maintenance = maintenance
+        # reload(): pedido de recarga de configuración por SIGHUP; se aplica al empezar el próximo ciclo
+        self.reload = reload
+        self.scheduler = scheduler
+        self.status_port = status_port
+        self.status_host = status_host
+        self.drain_timeout = drain_timeout
+        self.maintenance_interval = maintenance_interval
+        # Con HEALTH_MAX_AGE el límite es fijo; si no, se deriva del turno agendado tras el último éxito
+        self.health_max_age = health_max_age
+        self.health_grace = 600
+        self._health_deadline = None
+        self._stop = None
+        self._consecutive_errors = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cycle')
+        self.status = {
+            'state': 'starting',
+            'started_at': time.time(),
+            'cycles': 0,
+            'last_cycle_started_at': None,
+            'last_success_at': None,
+            'last_error': None,
+            'last_balance': {},
+            'next_run_at': None,
+        }
+    
+    def request_stop(self):
+        if self._stop.is_set():
+            logger.info("Shutdown already in progress, waiting for the current cycle to finish")
+            return
+        logger.info("Señal de interrupción recibida. Cerrando daemon al terminar el ciclo en curso...")
+        self.status['state'] = 'stopping'
+        self._stop.set()
+    
+    def request_reload(self):
+        logger.info("SIGHUP recibido: la configuración se recarga al comenzar el próximo ciclo")
+        self.reload()
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.request_stop)
+        if self.reload:
+            loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+        
+        server = None
+        if self.status_port:
+            server = await asyncio.start_server(self.handle_http, self.status_host, self.status_port)
+            logger.info(f"Status endpoint on http://{self.status_host}:{self.status_port}/status")
+        maintenance = asyncio.create_task(self.maintenance_loop())
+        
+        try:
+            await self.schedule_loop()
+        finally:
+            maintenance.cancel()
+            logger.info("Closing browsers and draining notification queue...")
+            await loop.run_in_executor(self._executor, self.close)
+            await loop.run_in_executor(None, get_outbox().stop, self.drain_timeout)
+            if server:
+                server.close()
+                await server.wait_closed()
+            self._executor.shutdown(wait=True)
+            self.status['state'] = 'stopped'
+            logger.info("Daemon detenido")
+    
+    async def schedule_loop(self):
+        self.status['state'] = 'running'
+        # Ejecutar inmediatamente la primera vez
+        await self.run_cycle()
+        
+        while not self._stop.is_set():
+            if self._consecutive_errors:
+                # Tras un error inesperado se reintenta con backoff en lugar de esperar el próximo turno
+                next_run = time.time() + backoff_delay(self._consecutive_errors)
+            else:
+                next_run = self.scheduler.next_run()
+                if self.last_cycle_succeeded():
+                    # Se tolera que falle el turno agendado, pero no el siguiente: el intervalo vigente
+                    # (ventana horaria, estiramiento por inactividad, configuración recargada) da el margen
+                    self._health_deadline = next_run + self.scheduler.interval(next_run) + self.health_grace
+            self.status['next_run_at'] = next_run
+            wait_time = max(0, next_run - time.time())
+            logger.info(f"Próxima verificación a las {datetime.fromtimestamp(next_run):%H:%M:%S} "
+                        f"(en {wait_time / 60:.1f} minutos)")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=wait_time)
+            except asyncio.TimeoutError:
+                await self.run_cycle()
+    
+    async def run_cycle(self):
+        """Corre el ciclo en el executor; una señal no lo interrumpe, se espera a que termine"""
+        loop = asyncio.get_running_loop()
+        self.status['cycles'] += 1
+        self.status['last_cycle_started_at'] = time.time()
+        try:
+            totals = await asyncio.shield(loop.run_in_executor(self._executor, self.cycle))
+        except Exception as e:
+            self._consecutive_errors += 1
+            logger.error(f"Error inesperado en daemon: {str(e)}")
+            self.status['last_error'] = str(e)
+            return
+        
+        self._consecutive_errors = 0
+        for name, total in totals.items():
+            if total is not None:
+                self.status['last_balance'][name or 'default'] = total
+        # Un ciclo sin cuentas (todas asignadas a otros nodos) también es un ciclo sano
+        if None not in totals.values():
+            self.status['last_success_at'] = time.time()
+            self.status['last_error'] = None
+        else:
+            self.status['last_error'] = 'Some accounts failed in the last cycle'
+        
+        # Los totales de todas las cuentas permiten detectar ciclos sin cambios
+        self.scheduler.observe(None if not totals or None in totals.values() else tuple(totals.values()))
+    
+    async def maintenance_loop(self):
+        """Persistencia periódica fuera del ciclo: historial pendiente y métricas"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            history = get_history()
+            if history is not None:
+                await loop.run_in_executor(None, history.flush)
+            await loop.run_in_executor(None, get_metrics().export)
+            if self.maintenance:
+                try:
+                    await loop.run_in_executor(None, self.maintenance)
+                except Exception as e:
+                    logger.warning(f"Maintenance task failed: {str(e)}")
+    
+    def status_payload(self):
+        status = dict(self.status)
+        for key in ('started_at', 'last_cycle_started_at', 'last_success_at', 'next_run_at'):
+            status[key] = isoformat(status[key])
+        status['healthy_until'] = isoformat(self.health_deadline())
+        status['in_flight_phase'] = get_metrics().in_flight()
+        return status
+    
+    def last_cycle_succeeded(self):
+        success = self.status['last_success_at']
+        return success is not None and success >= self.status['last_cycle_started_at']
+    
+    def health_deadline(self):
+        """Hora a partir de la cual, sin una verificación exitosa, /healthz responde 503"""
+        reference = self.status['last_success_at'] or self.status['started_at']
+        if self.health_max_age:
+            return reference + self.health_max_age
+        if self._health_deadline is not None:
+            return self._health_deadline
+        # Antes del primer éxito: dos intervalos desde el arranque
+        started = self.status['started_at']
+        return started + 2 * self.scheduler.interval(started) + self.health_grace
+    
+    def is_healthy(self):
+        return self.status['state'] != 'stopped' and time.time() <= self.health_deadline()
+    
+    async def handle_http(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            
+            parts = request_line.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            if path == '/status':
+                status, content_type = 200, 'application/json'
+                body = json.dumps(self.status_payload(), ensure_ascii=False)
+            elif path == '/healthz':
+                healthy = self.is_healthy()
+                status, content_type, body = (200 if healthy else 503), 'text/plain', ('ok' if healthy else 'stale')
+            elif path == '/metrics':
+                status, content_type = 200, 'text/plain; version=0.0.4'
+                body = get_metrics().render_prometheus()
+            else:
+                status, content_type, body = 404, 'text/plain', 'not found'
+            
+            data = body.encode('utf-8')
+            reason = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,79 @@
+import re
+
+# Importes en formato argentino: "." separa miles y "," decimales ("$ 1.234.567,89")
+AMOUNT_RE = re.compile(r'(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+))?')
+# Negativo: entre paréntesis, con el signo adelante ("-$ 10", "$ -10") o atrás ("$ 10-")
+NEGATIVE_RE = re.compile(r'^\s*\(|[-−]\s*(?:U\$S|USD|US\$|ARS|\$)?\s*\d|\d\s*[-−]\s*$')
+CURRENCY_RE = re.compile(r'U\$S|US\$|USD|EUR|€|ARS|\$', re.IGNORECASE)
+
+CURRENCIES = {
+    'u$s': 'USD',
+    'us$': 'USD',
+    'usd': 'USD',
+    'eur': 'EUR',
+    '€': 'EUR',
+    'ars': 'ARS',
+    '$': 'ARS',
+}
+
+# Moneda del campo 'total' (el de las reglas y el email); las demás se suman aparte en 'totals'
+MAIN_CURRENCY = 'ARS'
+
+SYMBOLS = {'ARS': '$', 'USD': 'U$S', 'EUR': '€'}
+
+def parse_amount(text):
+    """Convierte un importe como '$ 1.234.567,89' a float, o None si no hay número"""
+    match = AMOUNT_RE.search(text or '')
+    if not match:
+        return None
+    
+    integer, decimals = match.groups()
+    value = float(integer.replace('.', '') + '.' + (decimals or '0'))
+    if NEGATIVE_RE.search(text):
+        value = -value
+    return value
+
+def parse_currency(text, default='ARS'):
+    match = CURRENCY_RE.search(text or '')
+    if not match:
+        return default
+    return CURRENCIES[match.group(0).lower()]
+
+def format_amount(value, currency=MAIN_CURRENCY):
+    return f"{SYMBOLS.get(currency, currency)} {value:,.2f}"
+
+def format_totals(totals):
+    """'$ 1,234.50 / U$S 100.00': los totales por moneda, la principal primero"""
+    currencies = sorted(totals, key=lambda currency: (currency != MAIN_CURRENCY, currency))
+    return ' / '.join(format_amount(totals[currency], currency) for currency in currencies)
+
+def balance_from_rows(rows):
+    """Cuentas y totales a partir de filas {'label', 'text'}; devuelve (datos o None, filas no parseadas)
+    
+    Los saldos no se suman entre monedas: 'totals' tiene un total por moneda y 'total' es el de
+    MAIN_CURRENCY (0 si no hay cuentas en esa moneda).
+    """
+    accounts = []
+    failures = []
+    totals = {}
+    
+    for i, row in enumerate(rows):
+        balance_text = row['text']
+        balance_value = parse_amount(balance_text)
+        
+        if balance_value is None:
+            failures.append((i, balance_text))
+            continue
+        currency = parse_currency(balance_text)
+        accounts.append({
+            'index': i,
+            'name': row['label'] or f"Cuenta{i+1}",
+            'currency': currency,
+            'balance': balance_value,
+            'raw': balance_text
+        })
+        totals[currency] = totals.get(currency, 0) + balance_value
+    
+    if not accounts:
+        return None, failures
+    return {'accounts': accounts, 'totals': totals, 'total': totals.get(MAIN_CURRENCY, 0)}, failures
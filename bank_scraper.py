@@ -1,21 +1,32 @@
 import os
 import time
-import signal
 import sys
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
+
+# El profiler tiene que instalarse antes de cualquier otro import para medirlos
+if '--profile-startup' in sys.argv:
+    from startup_profile import profiler
+    profiler.install()
+else:
+    profiler = None
+
 import logging
+from balance_parser import balance_from_rows, format_amount, format_totals
+from history_store import get_history, account_key
+from scheduler import PollScheduler, backoff_delay
+from metrics import get_metrics, timed
+from wait_engine import get_wait_engine
+from resilience import CircuitOpen, get_login_breaker
+from alert_rules import get_alert_engine
+from config import ConfigError, load_env, get_config, get_config_manager
+from log_pipeline import setup_logging, set_log_secrets, log_context, new_cycle_id
+from browser_profile import (
+    apply_lean_options, enable_page_stats, enable_request_blocking, blocked_url_patterns, collect_page_stats
+)
 
-load_dotenv()
+# Selenium, requests, smtplib/email y dotenv se importan recién cuando se usan: una ejecución
+# por cron que falla la validación de configuración o no envía emails no paga ese costo.
 
+# Handler provisorio para los usos como módulo; main() lo reemplaza por el pipeline en background
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -23,258 +34,813 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+BALANCE_SELECTOR = 'td[headers="_Saldo disponible"]'
+
+# Selectores CSS de los que depende el scraper, por página; debug_scraper los compara contra un
+# snapshot del DOM para detectar cambios del portal antes de que fallen las verificaciones
+REQUIRED_SELECTORS = {
+    'login': {
+        'username': '#textField1',
+        'user_button': '#processCustomerLogin',
+    },
+    'login_password': {
+        'password': '#login_textField1',
+        'login_button': '#processSystem_UserLogin',
+    },
+    'home': {
+        'balance': BALANCE_SELECTOR,
+        'logout': '#widgetLogoutBtn',
+    },
+}
+
+# Devuelve etiqueta de la cuenta y texto del saldo de cada fila de la tabla
+BALANCE_TABLE_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (cell) {
+    var row = cell.closest('tr');
+    var labelCell = row && (row.querySelector('th, td[headers*="Cuenta"]') || row.cells[0]);
+    return {
+        label: labelCell && labelCell !== cell ? labelCell.innerText.trim() : '',
+        text: cell.innerText.trim()
+    };
+});
+"""
+
 class BankScraper:
-    def __init__(self):
+    def __init__(self, persistent=False, profile=None, http_polling=False, config=None):
         self.driver = None
-        self.bank_url = os.getenv('BANK_URL', '')
-        self.username = os.getenv('BANK_USERNAME', '')
-        self.password = os.getenv('BANK_PASSWORD', '')
-        self.threshold_amount = float(os.getenv('THRESHOLD_AMOUNT', '1000'))
-        self.email_from = os.getenv('EMAIL_FROM', '')
-        self.email_password = os.getenv('EMAIL_PASSWORD', '')
-        self.email_to = os.getenv('EMAIL_TO', '')
-        
+        # En modo persistente el driver y la sesión sobreviven entre ciclos
+        self.persistent = persistent
+        self.home_url = None
+        # En modo HTTP se usa Selenium solo para el login y los polls van por requests
+        self.http_polling = http_polling
+        self.poller = None
+        # Totales por moneda del último ciclo (None si falló), usados por el planificador
+        self.last_total = None
+        self.driver_cycles = 0
+        self.driver_rss = 0
+        # Archivo del HTML crudo de cada ciclo para depurar y re-parsear (PAGE_ARCHIVE_DIR)
+        self.archive = None
+        self.waits = get_wait_engine()
+        # La configuración se carga y valida una sola vez por proceso
+        config = config or get_config()
+        if config.page_archive_dir:
+            from page_archive import get_page_archive
+            self.archive = get_page_archive(config.page_archive_dir)
+        self.apply_config(config, profile or config.accounts[0])
+    
+    def apply_config(self, config, account):
+        """Toma los valores de la configuración vigente; se llama entre ciclos, sin cerrar el navegador"""
+        previous = getattr(self, 'account', None)
+        if previous is not None and not account.same_login(previous):
+            # Otras credenciales u otro portal: ni el navegador ni las cookies del poller HTTP sirven
+            # (en modo HTTP el navegador ya está cerrado y la sesión vive solo en el poller)
+            logger.info(f"Credentials changed for '{account.name or 'default'}', closing the current session")
+            if self.driver:
+                self.close()
+            if self.poller:
+                self.poller.invalidate()
+        self.account = account
+        self.name = account.name
+        self.bank_url = account.bank_url
+        self.username = account.username
+        self.password = account.password
+        self.threshold_amount = account.threshold
+        self.email_to = account.email_to
+        self.alert_rules = list(account.rules)
+        self.breaker_key = self.name or 'default'
+        # Opciones del navegador: se aplican la próxima vez que se lance
+        self.profile_dir = config.profile_dir
+        self.lean_browser = config.lean_browser
+        self.block_patterns = blocked_url_patterns(
+            config.lean_block_types, config.lean_block_third_party, config.lean_block_urls
+        )
+        self.page_stats = config.page_stats
+        # Arranque en frío más rápido: chromedriver y/o Chrome ya en ejecución
+        self.chromedriver_url = config.chromedriver_url
+        self.debugger_address = config.debugger_address
+        # Reciclado del navegador en sesiones largas: tras N ciclos o sobre un tope de memoria (0 = sin límite)
+        self.max_driver_cycles = config.max_driver_cycles
+        self.max_driver_rss = config.max_driver_rss_mb * 1024 * 1024
+        self.phase_retries = config.phase_retries
+        self.scrape_movements_enabled = config.scrape_movements
+        self.movements_max_pages = config.movements_max_pages
+    
+    @timed('setup_driver')
     def setup_driver(self, headless=True):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        
         chrome_options = Options()
-        if headless:
-            chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--disable-web-security')
-        chrome_options.add_argument('--disable-features=VizDisplayCompositor')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+        if self.debugger_address:
+            # Chrome ya lanzado con --remote-debugging-port: los flags de arranque no aplican
+            chrome_options.add_experimental_option('debuggerAddress', self.debugger_address)
+        else:
+            if headless:
+                chrome_options.add_argument('--headless')
+            chrome_options.add_argument('--no-sandbox')
+            chrome_options.add_argument('--disable-dev-shm-usage')
+            chrome_options.add_argument('--disable-gpu')
+            chrome_options.add_argument('--disable-web-security')
+            chrome_options.add_argument('--disable-features=VizDisplayCompositor')
+            chrome_options.add_argument('--window-size=1920,1080')
+            chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+            if self.profile_dir:
+                # Perfil en disco para conservar las cookies entre reinicios del navegador
+                chrome_options.add_argument(f'--user-data-dir={self.profile_dir}')
+            if self.lean_browser:
+                apply_lean_options(chrome_options)
+        if self.page_stats:
+            enable_page_stats(chrome_options)
         
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.driver.implicitly_wait(10)
-            logger.info("Chrome driver initialized successfully")
+            # Sin espera implícita: todas las esperas pasan por el WaitEngine
+            if self.chromedriver_url:
+                # chromedriver ya corriendo (p. ej. `chromedriver --port=9515`): se ahorra su arranque
+                self.driver = webdriver.Remote(command_executor=self.chromedriver_url, options=chrome_options)
+            else:
+                self.driver = webdriver.Chrome(options=chrome_options)
+            self.driver_cycles = 0
+            if self.lean_browser:
+                enable_request_blocking(self.driver, self.block_patterns)
+            logger.info(f"Chrome driver initialized successfully ({'lean' if self.lean_browser else 'full'} profile)")
         except Exception as e:
             logger.error(f"Failed to initialize Chrome driver: {str(e)}")
             raise
+    
+    def log_page_stats(self, page):
+        if not self.page_stats:
+            return
+        try:
+            stats = collect_page_stats(self.driver)
+        except Exception as e:
+            logger.warning(f"Could not collect page stats: {str(e)}")
+            return
+        
+        profile = self.name or 'default'
+        metrics = get_metrics()
+        metrics.inc('page_bytes_total', stats['bytes'], profile=profile, page=page)
+        metrics.inc('blocked_requests_total', stats['blocked'], profile=profile, page=page)
+        logger.info(
+            f"Page stats for {page} ({'lean' if self.lean_browser else 'full'}): "
+            f"{stats['requests']} requests, {stats['bytes'] / 1024:.1f} KiB transferred, "
+            f"{stats['blocked']} blocked, DOM ready {stats.get('dom_ms')} ms, load {stats.get('load_ms')} ms"
+        )
         
+    @timed('login')
     def login(self):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        
+        # Tras logins fallidos repetidos no se insiste para no bloquear la cuenta
+        breaker = get_login_breaker()
+        if not breaker.allow(self.breaker_key):
+            raise CircuitOpen(f"Login circuit open, next attempt in {breaker.retry_after(self.breaker_key):.0f}s")
+        
+        login_page = REQUIRED_SELECTORS['login']
+        password_page = REQUIRED_SELECTORS['login_password']
         try:
             self.driver.get(self.bank_url)
+            self.log_page_stats('login')
             
             # Paso 1: Ingresar usuario
-            username_field = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "textField1"))
-            )
+            username_field = self.waits.element(self.driver, 'login_username', (By.CSS_SELECTOR, login_page['username']), clickable=True)
             username_field.send_keys(self.username)
             
             # Hacer click en el botón de usuario
-            user_button = self.driver.find_element(By.ID, "processCustomerLogin")
+            user_button = self.waits.element(self.driver, 'login_user_button', (By.CSS_SELECTOR, login_page['user_button']), clickable=True)
             user_button.click()
             
             # Paso 2: Esperar a que aparezca el campo de contraseña
-            password_field = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "login_textField1"))
-            )
+            password_field = self.waits.element(self.driver, 'login_password', (By.CSS_SELECTOR, password_page['password']), clickable=True)
             password_field.send_keys(self.password)
             
             # Hacer click en el botón de login
-            login_button = self.driver.find_element(By.ID, "processSystem_UserLogin")
+            login_button = self.waits.element(self.driver, 'login_submit', (By.CSS_SELECTOR, password_page['login_button']), clickable=True)
             login_button.click()
             
             # Esperar a que se cargue la página principal
-            WebDriverWait(self.driver, 15).until(
-                EC.url_changes(self.bank_url)
+            self.waits.until(
+                self.driver, 'login_redirect', EC.url_changes(self.bank_url), f"URL change from {self.bank_url}",
+                default_timeout=15, navigation=True
             )
             
+            self.home_url = self.driver.current_url
             logger.info("Login successful")
+            breaker.record_success(self.breaker_key)
+            self.log_page_stats('home')
+            self.archive_page('login_result')
             return True
             
         except Exception as e:
+            self.archive_page('login_result')
+            get_metrics().inc('login_failures_total', profile=self.name or 'default')
+            breaker.record_failure(self.breaker_key)
             logger.error(f"Login failed: {str(e)}")
             return False
     
-    def get_balance(self):
+    def is_driver_alive(self):
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+    
+    @timed('session_check')
+    def is_session_active(self):
+        """Recarga la página principal y verifica que la sesión siga autenticada"""
         try:
-            # Buscar todos los elementos td con headers="_Saldo disponible"
-            balance_elements = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'td[headers="_Saldo disponible"]'))
+            self.driver.get(self.home_url or self.bank_url)
+            
+            # Se consulta el DOM por script para resolver ambos casos en un round trip
+            state = self.waits.until(
+                self.driver,
+                'session_check',
+                lambda d: d.execute_script(
+                    "if (document.querySelector(arguments[0])) return 'active';"
+                    "if (document.getElementById('textField1')) return 'expired';"
+                    "return null;",
+                    BALANCE_SELECTOR
+                ),
+                f"{BALANCE_SELECTOR} or #textField1"
             )
+            return state == 'active'
             
-            accounts = []
-            total_balance = 0
+        except Exception as e:
+            logger.info(f"Could not verify existing session: {str(e)}")
+            return False
+    
+    def ensure_session(self, headless=True):
+        """Reutiliza el driver y la sesión vigentes, o inicia sesión si expiró"""
+        if self.is_driver_alive():
+            if self.is_session_active():
+                logger.info("Reusing existing authenticated session")
+                return True
+        else:
+            self.close_driver()
+            self.setup_driver(headless=headless)
             
-            for i, balance_element in enumerate(balance_elements):
-                balance_text = balance_element.text
-                logger.info(f"Raw balance text for account {i+1}: '{balance_text}'")
-                
-                # Limpiar el texto para extraer el número
-                # Remover símbolos de moneda, espacios y convertir comas por puntos
-                clean_text = balance_text.replace('$', '').replace('ARS', '').replace(' ', '').replace(',', '.')
-                
-                # Buscar el número en el texto limpio
-                import re
-                numbers = re.findall(r'[-+]?\d*\.?\d+', clean_text)
-                
-                if numbers:
-                    balance_value = float(numbers[0])
-                    account_name = f"Cuenta{i+1}"
-                    accounts.append({
-                        'name': account_name,
-                        'balance': balance_value
-                    })
-                    total_balance += balance_value
-                    logger.info(f"Parsed balance for {account_name}: ${balance_value}")
-                else:
-                    logger.error(f"Could not parse balance from text for account {i+1}: '{balance_text}'")
-            
-            if accounts:
-                logger.info(f"Total balance across all accounts: ${total_balance}")
-                return {
-                    'accounts': accounts,
-                    'total': total_balance
-                }
-            else:
-                logger.error("No valid balances found")
-                return None
+            if self.profile_dir and self.is_session_active():
+                logger.info("Restored authenticated session from Chrome profile")
+                return True
+        
+        logger.info("Session expired or not found, logging in")
+        return self.login()
+    
+    def close_driver(self):
+        if self.driver:
+            from process_watchdog import driver_root_pid, process_tree, kill_processes
+            
+            # El árbol se toma antes del quit(): si chromedriver muere, sus Chrome quedan colgados de init
+            root_pid = driver_root_pid(self.driver)
+            tree = process_tree(root_pid) if root_pid else []
+            try:
+                # Con CHROME_DEBUGGER_ADDRESS quit() solo libera la sesión: el Chrome externo sigue abierto
+                self.driver.quit()
+            except Exception as e:
+                logger.warning(f"Error closing Chrome driver: {str(e)}")
+            leftovers = [proc for proc in tree if proc.is_running()]
+            if leftovers:
+                logger.warning(f"Killing {len(leftovers)} browser processes left after quit()")
+                kill_processes(leftovers)
+        self.driver = None
+        self.home_url = None
+        self.driver_rss = 0
+    
+    def check_driver_memory(self):
+        """Registra la memoria del árbol del navegador; True si corresponde reciclarlo"""
+        from process_watchdog import driver_root_pid, tree_memory
+        
+        self.driver_cycles += 1
+        root_pid = driver_root_pid(self.driver)
+        if root_pid is None:
+            return bool(self.max_driver_cycles) and self.driver_cycles >= self.max_driver_cycles
+        
+        self.driver_rss, processes = tree_memory(root_pid)
+        profile = self.name or 'default'
+        metrics = get_metrics()
+        metrics.set_gauge('driver_rss_bytes', self.driver_rss, profile=profile)
+        metrics.set_gauge('driver_processes', processes, profile=profile)
+        metrics.set_gauge('driver_cycles', self.driver_cycles, profile=profile)
+        logger.info(f"Browser memory: {self.driver_rss / 1024 / 1024:.0f} MB in {processes} processes "
+                    f"after {self.driver_cycles} cycles")
+        
+        if self.max_driver_cycles and self.driver_cycles >= self.max_driver_cycles:
+            logger.info(f"Recycling browser after {self.driver_cycles} cycles")
+            return True
+        if self.max_driver_rss and self.driver_rss > self.max_driver_rss:
+            logger.warning(f"Recycling browser: {self.driver_rss / 1024 / 1024:.0f} MB over the "
+                           f"{self.max_driver_rss / 1024 / 1024:.0f} MB ceiling")
+            return True
+        return False
+    
+    def close(self):
+        """Cierra la sesión y el navegador (fin del daemon o de los reintentos de una verificación)"""
+        if self.is_driver_alive() and self.home_url:
+            self.logout()
+        self.close_driver()
+    
+    @timed('get_balance')
+    def get_balance(self):
+        from selenium.webdriver.common.by import By
+        
+        try:
+            # Esperar a que aparezca al menos una celda con headers="_Saldo disponible"
+            self.waits.element(self.driver, 'balance_table', (By.CSS_SELECTOR, BALANCE_SELECTOR))
+            
+            # Leer toda la tabla en un único round trip en lugar de un .text por cuenta
+            rows = self.driver.execute_script(BALANCE_TABLE_SCRIPT, BALANCE_SELECTOR)
+            self.archive_page('balance')
+            
+            return self.parse_balance_rows(rows)
             
         except Exception as e:
             logger.error(f"Could not get balance: {str(e)}")
             return None
     
+    def archive_page(self, kind, html=None, url=None):
+        """Guarda el HTML de la página actual (o el dado) si el archivo de páginas está activado"""
+        if self.archive is None:
+            return
+        try:
+            if html is None:
+                html, url = self.driver.page_source, self.driver.current_url
+            self.archive.store(self.name, kind, html, url or '')
+        except Exception as e:
+            logger.warning(f"Could not archive {kind} page: {str(e)}")
+    
+    def parse_balance_rows(self, rows):
+        balance_data, failures = balance_from_rows(rows)
+        
+        for i, balance_text in failures:
+            get_metrics().inc('parse_failures_total', profile=self.name or 'default')
+            logger.error(f"Could not parse balance from text for account {i+1}: '{balance_text}'")
+        
+        if balance_data is None:
+            logger.error("No valid balances found")
+            return None
+        
+        # Una línea por cuenta solo en DEBUG: con muchas cuentas y ciclos es lo que más volumen generaba
+        for account in balance_data['accounts']:
+            logger.debug(f"Parsed balance for {account['name']}: {account['currency']} {account['balance']} "
+                         f"(raw: '{account['raw']}')")
+        logger.info(f"Total balance across all accounts: {format_totals(balance_data['totals'])}")
+        return balance_data
+    
+    @timed('logout')
     def logout(self):
+        from selenium.webdriver.common.by import By
+        
         try:
-            logout_button = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.ID, "widgetLogoutBtn"))
-            )
+            logout_button = self.waits.element(self.driver, 'logout_button', (By.CSS_SELECTOR, REQUIRED_SELECTORS['home']['logout']), clickable=True)
             logout_button.click()
             logger.info("Logout successful")
         except Exception as e:
             logger.error(f"Logout failed: {str(e)}")
     
-    def send_notification(self, balance_data):
+    @timed('send_notification')
+    def send_notification(self, balance_data, alerts):
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.email_from
-            msg['To'] = self.email_to
-            msg['Subject'] = f"Balance Alert: ${balance_data['total']}"
+            subject = f"Balance Alert: {format_totals(balance_data['totals'])}"
+            if self.name:
+                subject += f" ({self.name})"
             
             # Crear detalle de cuentas
             accounts_detail = ""
             for account in balance_data['accounts']:
-                accounts_detail += f"  {account['name']}: ${account['balance']:,.2f}\n"
+                accounts_detail += f"  {account['name']}: {format_amount(account['balance'], account['currency'])}\n"
+                for movement in account.get('new_movements', []):
+                    amount = format_amount(movement['amount'], movement['currency']) if movement['amount'] is not None else '?'
+                    accounts_detail += f"      {movement['date']}  {movement['description']}  {amount}\n"
+            
+            # Detalle de las reglas que dispararon la alerta
+            alerts_detail = ""
+            for alert in alerts:
+                alerts_detail += f"  [{alert['rule']}] {alert['message']}\n"
             
             body = f"""
             ¡Alerta de saldo!
             
+            Reglas disparadas:
+{alerts_detail}
             Detalle por cuenta:
 {accounts_detail}
-            Saldo total: ${balance_data['total']:,.2f}
-            Este monto es mayor al límite establecido de: ${self.threshold_amount:,.2f}
+            Saldo total: {format_totals(balance_data['totals'])}
             
             Fecha: {time.strftime('%Y-%m-%d %H:%M:%S')}
             """
             
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.email_from, self.email_password)
-            server.send_message(msg)
-            server.quit()
-            
-            logger.info(f"Notification sent successfully for total balance: ${balance_data['total']}")
+            # El envío lo hace el worker del outbox, sin bloquear el ciclo de scraping
+            from notification_outbox import get_outbox
+            get_outbox().enqueue(self.email_to, subject, body)
+            return True
             
         except Exception as e:
-            logger.error(f"Failed to send notification: {str(e)}")
+            logger.error(f"Failed to queue notification: {str(e)}")
+            return False
     
-    def check_balance_and_notify(self, headless=True):
+    def handle_balance(self, balance_data):
+        self.last_total = balance_data['totals']
+        history = get_history()
+        if history is not None:
+            try:
+                history.record(balance_data, profile=self.name)
+            except Exception as e:
+                logger.error(f"Failed to store balance history: {str(e)}")
+        
+        self.notify_if_needed(balance_data)
+    
+    def notify_if_needed(self, balance_data):
+        # El motor de reglas guarda el estado de cada regla: solo notifica cruces, no cada ciclo
+        engine = get_alert_engine()
+        alerts, state = engine.evaluate(self.name, balance_data, self.alert_rules)
+        
+        if alerts:
+            for alert in alerts:
+                logger.info(f"Alert rule '{alert['rule']}' triggered: {alert['message']}")
+            if not self.send_notification(balance_data, alerts):
+                # Sin guardar el estado: la próxima lectura vuelve a disparar estas alertas
+                logger.warning("Alert state not saved, the alerts will be retried on the next reading")
+                return
+        else:
+            logger.info(f"Total balance {format_totals(balance_data['totals'])} triggered no alert rules")
+        engine.commit(self.name, state)
+    
+    @timed('http_poll')
+    def poll_balance_http(self):
+        """Lee el saldo por HTTP con las cookies exportadas; None si la sesión venció y hay que volver a Selenium
+        
+        Un timeout o un error 5xx no dicen nada de la sesión: se propaga la excepción, el ciclo falla y
+        el próximo intento reutiliza las mismas cookies sin un login que cuente para el circuito.
+        """
+        if self.poller is None or not self.poller.ready:
+            return None
+        
+        import requests
+        from http_poller import SessionExpired
+        try:
+            rows = self.poller.fetch_rows()
+            logger.info("Balance page fetched over HTTP")
+            self.archive_page('balance', self.poller.last_html, self.poller.balance_url)
+            return self.parse_balance_rows(rows)
+        except SessionExpired as e:
+            logger.info(f"HTTP session expired ({str(e)}), falling back to Selenium login")
+        except requests.RequestException as e:
+            logger.warning(f"HTTP poll failed ({str(e)}), keeping the session for the next attempt")
+            raise
+        self.poller.invalidate()
+        return None
+    
+    def login_for_http(self, headless=True):
+        """Inicia sesión con Selenium, lee el saldo y exporta las cookies al poller HTTP"""
         try:
             self.setup_driver(headless=headless)
             
             if not self.login():
-                return False
-                
+                return None
+            
             balance_data = self.get_balance()
+            if balance_data is not None:
+                if self.poller is None:
+                    from http_poller import HttpBalancePoller
+                    self.poller = HttpBalancePoller(USER_AGENT)
+                # Sin logout: cerrar sesión invalidaría las cookies exportadas
+                self.poller.load_cookies(self.driver, self.home_url)
+            return balance_data
+            
+        finally:
+            self.close_driver()
+    
+    def check_balance_http(self, headless=True):
+        try:
+            balance_data = self.poll_balance_http()
+            if balance_data is None:
+                balance_data = self.login_for_http(headless=headless)
             
             if balance_data is None:
                 return False
-                
-            total_balance = balance_data['total']
             
-            if total_balance > self.threshold_amount:
-                logger.info(f"Total balance ${total_balance} exceeds threshold ${self.threshold_amount}")
-                self.send_notification(balance_data)
+            self.handle_balance(balance_data)
+            return True
+            
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            logger.error(f"Error during balance check: {str(e)}")
+            return False
+    
+    def retry_phase(self, phase, func, before_retry=None):
+        """Reintenta una fase sobre el driver vivo; None, False o una excepción cuentan como falla"""
+        for attempt in range(1, self.phase_retries + 2):
+            try:
+                result = func()
+                if result is not None and result is not False:
+                    return result
+            except CircuitOpen:
+                raise
+            except Exception as e:
+                logger.warning(f"Phase {phase} raised: {str(e)}")
+            
+            if attempt > self.phase_retries:
+                return None
+            
+            get_metrics().inc('phase_retries_total', profile=self.name or 'default', phase=phase)
+            wait_time = backoff_delay(attempt, base=2, cap=10)
+            logger.info(f"Retrying phase {phase} in {wait_time:.1f}s (retry {attempt}/{self.phase_retries})")
+            time.sleep(wait_time)
+            if before_retry:
+                before_retry()
+    
+    def reload_home(self):
+        self.driver.get(self.home_url or self.bank_url)
+    
+    @timed('movements')
+    def scrape_movements(self, balance_data):
+        """Guarda los movimientos nuevos de cada cuenta, paginando solo hasta la marca de agua"""
+        history = get_history()
+        if history is None:
+            logger.warning("Movements scraping requires the balance history store (HISTORY_DB)")
+            return
+        
+        from movements import open_account_movements, iter_movements, collect_new_movements
+        
+        for position, account in enumerate(balance_data['accounts']):
+            key = account_key(self.name, account['name'])
+            watermark = history.movement_watermark(key)
+            try:
+                if position > 0:
+                    self.reload_home()
+                open_account_movements(self.driver, self.waits, BALANCE_SELECTOR, account['index'])
+                newest_id, count, recent = collect_new_movements(
+                    iter_movements(self.driver, self.waits, account['currency'], self.movements_max_pages),
+                    lambda movement_id: movement_id == watermark or history.has_movement(key, movement_id),
+                    lambda batch: history.store_movements(key, batch)
+                )
+            except Exception as e:
+                # Un fallo en los movimientos no invalida la lectura de saldos
+                logger.error(f"Could not scrape movements for {account['name']}: {str(e)}")
+                continue
+            
+            if newest_id:
+                history.set_movement_watermark(key, newest_id)
+            account['new_movements'] = recent
+            logger.info(f"Stored {count} new movements for {account['name']}")
+            for movement in recent:
+                logger.info(f"New movement for {account['name']}: {movement['date']} {movement['description']} "
+                            f"{movement['currency']} {movement['amount']}")
+        
+        self.reload_home()
+    
+    @timed('cycle')
+    def check_balance_and_notify(self, headless=True):
+        self.last_total = None
+        if self.http_polling:
+            return self.check_balance_http(headless=headless)
+        
+        success = False
+        try:
+            if self.persistent or self.is_driver_alive():
+                # Modo persistente o reintento tras una falla parcial: se reanuda sobre el driver vivo
+                if not self.ensure_session(headless=headless):
+                    return False
             else:
-                logger.info(f"Total balance ${total_balance} is below threshold ${self.threshold_amount}")
+                self.setup_driver(headless=headless)
                 
-            # Cerrar sesión
-            self.logout()
+                if not self.login():
+                    return False
+            
+            # Un timeout transitorio se reintenta sin volver a hacer login
+            balance_data = self.retry_phase('get_balance', self.get_balance, before_retry=self.reload_home)
+            
+            if balance_data is None:
+                return False
+            
+            if self.scrape_movements_enabled:
+                self.scrape_movements(balance_data)
+            
+            self.handle_balance(balance_data)
+            
+            # En modo persistente la sesión queda abierta para el próximo ciclo.
+            # Un logout fallido no invalida la lectura ya obtenida.
+            if not self.persistent:
+                self.logout()
             
+            success = True
             return True
             
+        except CircuitOpen:
+            raise
         except Exception as e:
             logger.error(f"Error during balance check: {str(e)}")
             return False
             
         finally:
-            if self.driver:
-                self.driver.quit()
+            # Tras un fallo se conserva el driver solo si sigue vivo y autenticado, para reanudar
+            if success:
+                if not self.persistent:
+                    self.check_driver_memory()
+                    self.close_driver()
+                elif self.check_driver_memory():
+                    # Se relanza en el próximo ciclo con un login nuevo
+                    self.close()
+            elif not (self.home_url and self.is_driver_alive()):
+                self.close_driver()
+                # Un crash puede dejar procesos de Chrome fuera del árbol que conocía el driver
+                from process_watchdog import reap_orphans
+                reap_orphans(self.chromedriver_url)
+
+def config_secrets(config):
+    """Valores que la política de logs 'credentials' reemplaza por *** si aparecen en un mensaje"""
+    secrets = [os.getenv('EMAIL_PASSWORD', '')]
+    for account in config.accounts:
+        secrets += [account.username, account.password]
+    return secrets
 
-def run_daemon():
-    """Ejecuta el scraper en modo daemon, verificando cada 30 minutos"""
+def run_daemon(persistent=False, http_polling=False):
+    """Ejecuta el scraper en modo daemon según el planificador configurado"""
+    config_manager = get_config_manager()
+    config = config_manager.current
+    scheduler = PollScheduler.from_config(config)
     logger.info("Iniciando Banco Macro Scraper en modo daemon")
-    logger.info("Verificaciones cada 30 minutos - Presiona Ctrl+C para detener")
+    logger.info(f"Planificación: {scheduler.describe()} - Presiona Ctrl+C para detener")
     
-    def signal_handler(signum, frame):
-        logger.info("Señal de interrupción recibida. Cerrando daemon...")
-        sys.exit(0)
+    # Se conserva un scraper por cuenta entre ciclos; en modo persistente o HTTP también su sesión
+    if persistent:
+        logger.info("Modo sesión persistente activado")
+    if http_polling:
+        logger.info("Modo polling HTTP activado")
+    # Navegadores que haya dejado una ejecución anterior interrumpida
+    from process_watchdog import reap_orphans, own_rss
+    reap_orphans(config.chromedriver_url)
     
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    options = {'persistent': persistent, 'http_polling': http_polling}
+    scrapers = {account.name: BankScraper(profile=account, config=config, **options) for account in config.accounts}
     
-    # Ejecutar inmediatamente la primera vez
-    run_single_check(headless=True)
+    # Varios nodos: cada cuenta se verifica en un solo nodo por intervalo (LEASE_DIR compartido)
+    leases = None
+    if os.getenv('LEASE_DIR'):
+        from lease_store import get_lease_store
+        leases = get_lease_store()
+        leases.heartbeat()
+        logger.info(f"Distribución por leases activada: nodo {leases.node_id} en {leases.directory}")
+        # Estado de alertas y del circuito de login: si cada nodo tiene el suyo, tras un traspaso se
+        # repiten los emails y cada nodo gasta su propio presupuesto de logins fallidos
+        from resilience import state_file
+        shared = os.path.realpath(leases.directory)
+        for var, filename in (('ALERT_STATE_FILE', 'alert_state.json'), ('CIRCUIT_STATE_FILE', 'circuit_state.json')):
+            path = state_file(var, filename)
+            if not path or os.path.commonpath([shared, os.path.realpath(path)]) != shared:
+                logger.warning(f"{var} ({path or 'en memoria'}) no está en LEASE_DIR: su estado no se comparte "
+                               f"entre nodos y puede haber alertas repetidas tras un traspaso")
     
-    # Luego ejecutar cada 30 minutos
-    while True:
+    def close_scrapers():
+        for scraper in scrapers.values():
+            scraper.close()
+        if leases:
+            leases.release_all()
+    
+    def apply_config(new_config):
+        """Aplica una configuración recargada entre ciclos, sin cerrar las sesiones que siguen válidas"""
+        scheduler.reconfigure(new_config)
+        daemon.health_max_age = new_config.health_max_age
+        for name in list(scrapers):
+            if new_config.account(name) is None:
+                logger.info(f"Cuenta '{name}' quitada de la configuración")
+                scrapers.pop(name).close()
+        for account in new_config.accounts:
+            if account.name in scrapers:
+                scrapers[account.name].apply_config(new_config, account)
+            else:
+                logger.info(f"Cuenta '{account.name}' agregada a la configuración")
+                scrapers[account.name] = BankScraper(profile=account, config=new_config, **options)
+        set_log_secrets(config_secrets(new_config))
+        logger.info(f"Nueva configuración aplicada: {scheduler.describe()}, {len(scrapers)} cuentas")
+    
+    def run_cycle():
+        with log_context(cycle_id=new_cycle_id()):
+            return check_cycle()
+    
+    def check_cycle():
+        # Límite entre ciclos: único punto donde cambia la configuración (SIGHUP o archivos modificados)
+        new_config = config_manager.refresh()
+        if new_config is not None:
+            apply_config(new_config)
+        
+        names = list(scrapers)
+        if leases:
+            now = time.time()
+            leases.heartbeat(now)
+            # Margen para el jitter: el turno propio puede adelantarse respecto del intervalo
+            min_interval = config_manager.current.lease_min_interval or \
+                scheduler.base_interval(now) * (1 - scheduler.jitter) * 0.9
+            keys = {name or 'default': name for name in names}
+            names = [keys[key] for key in leases.claim(list(keys), min_interval, now)]
+            # Las cuentas que pasaron a otro nodo no necesitan un navegador abierto en este
+            for key, name in keys.items():
+                if name not in names and leases.last_node(key) not in (None, leases.node_id):
+                    scrapers[name].close()
+        
         try:
-            logger.info(f"Esperando 30 minutos hasta la próxima verificación...")
-            time.sleep(1800)  # 30 minutos = 1800 segundos
-            run_single_check(headless=True)
-        except KeyboardInterrupt:
-            logger.info("Daemon detenido por el usuario")
-            break
-        except Exception as e:
-            logger.error(f"Error inesperado en daemon: {str(e)}")
-            logger.info("Continuando con el siguiente ciclo...")
-            time.sleep(60)  # Esperar 1 minuto antes del siguiente intento
+            if config_manager.current.multi_account:
+                selected = [account for account in config_manager.current.accounts if account.name in names]
+                if selected:
+                    from multi_account import run_parallel_checks
+                    run_parallel_checks(
+                        selected, run_single_check, lambda account: BankScraper(profile=account, config=config_manager.current, **options),
+                        headless=True, scrapers=scrapers,
+                    )
+            elif names:
+                run_single_check(headless=True, scraper=scrapers[''])
+        finally:
+            if leases:
+                for name in names:
+                    leases.release(name or 'default')
+        
+        daemon_rss = own_rss()
+        browsers_rss = sum(scraper.driver_rss for scraper in scrapers.values())
+        get_metrics().set_gauge('daemon_rss_bytes', daemon_rss)
+        logger.info(f"Memoria tras el ciclo: daemon {daemon_rss / 1024 / 1024:.0f} MB, "
+                    f"navegadores abiertos {browsers_rss / 1024 / 1024:.0f} MB")
+        return {name: scrapers[name].last_total for name in names}
+    
+    # Los ciclos bloqueantes corren en un executor; SIGTERM espera a que termine el ciclo en curso
+    import asyncio
+    from async_daemon import AsyncDaemon
+    daemon = AsyncDaemon(
+        run_cycle,
+        close_scrapers,
+        scheduler,
+        status_port=config.status_port,
+        health_max_age=config.health_max_age,
+        drain_timeout=float(os.getenv('OUTBOX_DRAIN_TIMEOUT', '30')),
+        maintenance=leases.heartbeat if leases else None,
+        reload=config_manager.request_reload,
+    )
+    asyncio.run(daemon.run())
 
-def run_single_check(headless=True, max_retries=3):
-    """Ejecuta una sola verificación con reintentos"""
+def run_single_check(headless=True, max_retries=3, scraper=None):
+    """Ejecuta una sola verificación con reintentos, reanudando sobre el mismo scraper"""
+    metrics = get_metrics()
+    # El mismo scraper se reutiliza entre intentos para conservar un driver ya autenticado
+    check_scraper = scraper or BankScraper()
+    profile = check_scraper.name or 'default'
+    try:
+        with log_context(account=profile):
+            return check_with_retries(check_scraper, headless, max_retries, profile)
+    
+    finally:
+        # Fuera del modo persistente no debe quedar un navegador abierto entre ciclos
+        if not check_scraper.persistent:
+            check_scraper.close()
+        metrics.export()
+        get_wait_engine().save()
+
+def check_with_retries(check_scraper, headless, max_retries, profile):
+    """Intentos de una verificación; los logs de todos quedan etiquetados con la cuenta"""
+    metrics = get_metrics()
     for attempt in range(1, max_retries + 1):
+        if attempt > 1:
+            metrics.inc('retries_total', profile=profile)
         try:
             logger.info(f"=== Iniciando verificación (intento {attempt}/{max_retries}) ===")
-            scraper = BankScraper()
-            success = scraper.check_balance_and_notify(headless=headless)
+            with metrics.span('check_attempt', profile=profile):
+                success = check_scraper.check_balance_and_notify(headless=headless)
             
             if success:
+                metrics.inc('checks_total', profile=profile, result='success')
                 logger.info("Verificación completada exitosamente")
                 return True
             else:
                 logger.warning(f"Verificación falló en intento {attempt}")
-                
+        
+        except CircuitOpen as e:
+            metrics.inc('checks_total', profile=profile, result='circuit_open')
+            logger.error(f"Verificación omitida: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error en intento {attempt}: {str(e)}")
-            
+        
         if attempt < max_retries:
-            wait_time = attempt * 60  # Esperar 60, 120, 180 segundos
-            logger.info(f"Esperando {wait_time} segundos antes del siguiente intento...")
+            # Backoff exponencial con tope para no desplazar demasiado el ciclo
+            wait_time = backoff_delay(attempt)
+            logger.info(f"Esperando {wait_time:.0f} segundos antes del siguiente intento...")
             time.sleep(wait_time)
     
+    metrics.inc('checks_total', profile=profile, result='failure')
     logger.error(f"Verificación falló después de {max_retries} intentos")
     return False
 
-def main():
-    # Verificar argumentos de línea de comandos
-    if '--daemon' in sys.argv:
-        run_daemon()
+def run_once(config):
+    if config.multi_account:
+        from multi_account import run_parallel_checks
+        logger.info(f"Ejecutando verificación de {len(config.accounts)} cuentas")
+        run_parallel_checks(
+            list(config.accounts), run_single_check, lambda account: BankScraper(profile=account, config=config),
+            headless='--debug' not in sys.argv,
+        )
     elif '--debug' in sys.argv:
         # Modo debug: una sola ejecución con ventana visible
         logger.info("Ejecutando en modo debug (una sola vez)")
@@ -284,5 +850,53 @@ def main():
         logger.info("Ejecutando verificación única")
         run_single_check(headless=True)
 
+def main():
+    # Antes de cualquier subcomando: --history y --reparse también leen HISTORY_DB y PAGE_ARCHIVE_DIR del .env
+    load_env()
+    if '--history' in sys.argv:
+        from history_store import history_main
+        history_main(sys.argv[sys.argv.index('--history') + 1:])
+        return
+    if '--reparse' in sys.argv:
+        from page_archive import reparse_main
+        sys.exit(reparse_main(sys.argv[sys.argv.index('--reparse') + 1:]))
+    
+    # Perfiles multi-cuenta: --accounts <archivo>, ACCOUNTS_FILE o BANK_PROFILES
+    accounts_file = os.getenv('ACCOUNTS_FILE', '')
+    if '--accounts' in sys.argv:
+        accounts_file = sys.argv[sys.argv.index('--accounts') + 1]
+    # Desde acá el formateo y la escritura de los logs corren en un thread aparte (LOG_FILE, LOG_FORMAT, LOG_MASK)
+    setup_logging()
+    if profiler:
+        profiler.mark('imports + .env')
+    
+    # Fallar rápido (antes de importar Selenium) si falta configuración
+    try:
+        config = get_config_manager(accounts_file).current
+    except ConfigError as e:
+        for error in e.errors:
+            logger.error(f"Configuration error: {error}")
+        sys.exit(2)
+    set_log_secrets(config_secrets(config))
+    # Las alertas que quedaron en cola no esperan a que se dispare una nueva para reintentarse
+    from notification_outbox import resume_outbox
+    resume_outbox()
+    if profiler:
+        profiler.mark('config validation')
+    
+    # Verificar argumentos de línea de comandos
+    if '--daemon' in sys.argv:
+        run_daemon(
+            persistent='--persistent' in sys.argv or os.getenv('PERSISTENT_SESSION', '').lower() == 'true',
+            http_polling='--http' in sys.argv or os.getenv('HTTP_POLLING', '').lower() == 'true'
+        )
+    else:
+        with log_context(cycle_id=new_cycle_id()):
+            run_once(config)
+    
+    if profiler:
+        profiler.mark('check')
+        profiler.report(phases=get_metrics().phase_totals())
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
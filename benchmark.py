@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import tempfile
+from statistics import mean
+
+from mock_portal import MockPortal
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+
+def percentile(samples, pct):
+    """Percentil por rango más cercano (válido también con pocas muestras)"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+class Timer:
+    def __init__(self):
+        self.samples = {}
+    
+    def measure(self, phase, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(phase, []).append(time.perf_counter() - started)
+        return result
+    
+    def summary(self):
+        summary = {}
+        for phase, samples in self.samples.items():
+            stats = {'n': len(samples), 'mean': mean(samples), 'max': max(samples)}
+            for pct in PERCENTILES:
+                stats[f"p{pct}"] = percentile(samples, pct)
+            summary[phase] = stats
+        return summary
+
+def configure_env(portal, workdir):
+    """Apunta el scraper al portal simulado sin enviar emails ni tocar el estado real
+    
+    Todo archivo de estado va a workdir y el resto se deja vacío en lugar de quitarlo: las
+    variables del entorno del proceso tienen prioridad sobre el .env que carga get_config().
+    """
+    os.environ.update({
+        'BANK_URL': portal.url,
+        'BANK_USERNAME': 'benchmark',
+        'BANK_PASSWORD': 'benchmark',
+        'BANK_PROFILES': '',
+        'ACCOUNTS_FILE': '',
+        'THRESHOLD_AMOUNT': '1e18',
+        'ALERT_RULES_FILE': '',
+        'ALERT_STATE_FILE': os.path.join(workdir, 'alert_state.json'),
+        'CIRCUIT_STATE_FILE': os.path.join(workdir, 'circuit_state.json'),
+        'WAIT_STATS_FILE': os.path.join(workdir, 'wait_stats.json'),
+        'HISTORY_DB': os.path.join(workdir, 'history.db'),
+        'OUTBOX_DIR': os.path.join(workdir, 'outbox'),
+        'PAGE_ARCHIVE_DIR': '',
+        'LEASE_DIR': '',
+        'METRICS_PROM_FILE': '',
+        'METRICS_JSONL': '',
+        'METRICS_PORT': '',
+        'CHROME_PROFILE_DIR': '',
+        # Siempre un Chrome nuevo con el perfil y los reintentos por defecto, para comparar corridas
+        'CHROME_DEBUGGER_ADDRESS': '',
+        'CHROMEDRIVER_URL': '',
+        'LEAN_BROWSER': 'false',
+        'PAGE_STATS': 'false',
+        'SCRAPE_MOVEMENTS': 'false',
+        'DRIVER_MAX_CYCLES': '0',
+        'DRIVER_MAX_RSS_MB': '0',
+        'PHASE_RETRIES': '2',
+        # Sin destinatario ni servidor SMTP: una alerta del benchmark nunca puede salir
+        'EMAIL_FROM': '',
+        'EMAIL_PASSWORD': '',
+        'EMAIL_TO': '',
+        'SMTP_HOST': '127.0.0.1',
+        'SMTP_PORT': '9',
+        'SMTP_STARTTLS': 'false',
+    })
+
+def bench_browser(timer, iterations, headless):
+    from bank_scraper import BankScraper
+    
+    for i in range(iterations):
+        scraper = BankScraper()
+        try:
+            timer.measure('driver_startup', scraper.setup_driver, headless=headless)
+            if not timer.measure('login', scraper.login):
+                raise RuntimeError("Login against mock portal failed")
+            if timer.measure('get_balance', scraper.get_balance) is None:
+                raise RuntimeError("Balance extraction against mock portal failed")
+            timer.measure('logout', scraper.logout)
+        finally:
+            timer.measure('driver_quit', scraper.close_driver)
+        
+        if not timer.measure('full_cycle', BankScraper().check_balance_and_notify, headless=headless):
+            raise RuntimeError("Full cycle against mock portal failed")
+        logger.info(f"Browser iteration {i + 1}/{iterations} done")
+
+def bench_http(timer, iterations, portal):
+    from bank_scraper import BankScraper, USER_AGENT
+    from http_poller import HttpBalancePoller
+    
+    scraper = BankScraper()
+    poller = HttpBalancePoller(USER_AGENT)
+    poller.session.post(portal.url + 'login', data={'username': 'benchmark', 'password': 'benchmark'})
+    poller.balance_url = portal.url + 'home'
+    
+    for _ in range(iterations):
+        rows = timer.measure('http_poll', poller.fetch_rows)
+        timer.measure('parse_rows', scraper.parse_balance_rows, rows)
+
+def print_report(summary, portal, output):
+    output.write(f"Mock portal: {portal.accounts} accounts, {portal.latency * 1000:.0f} ms latency, "
+                 f"{portal.requests} requests served\n")
+    header = f"{'phase':<16}{'n':>5}" + ''.join(f"{name:>10}" for name in ('mean', 'p50', 'p90', 'p99', 'max'))
+    output.write(header + ' (ms)\n')
+    for phase, stats in summary.items():
+        values = ''.join(f"{stats[name] * 1000:>10.1f}" for name in ('mean', 'p50', 'p90', 'p99', 'max'))
+        output.write(f"{phase:<16}{stats['n']:>5}{values}\n")
+
+def compare(summary, baseline_path, tolerance):
+    """Devuelve las fases cuyo p50 empeoró más que la tolerancia respecto de la línea base"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['phases']
+    regressions = []
+    for phase, stats in summary.items():
+        if phase in baseline and stats['p50'] > baseline[phase]['p50'] * (1 + tolerance):
+            regressions.append((phase, baseline[phase]['p50'], stats['p50']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline de BankScraper contra un portal simulado')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--accounts', type=int, default=3, help='Cuentas en la tabla de saldos simulada')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latencia por request en milisegundos')
+    parser.add_argument('--headed', action='store_true', help='Mostrar la ventana de Chrome')
+    parser.add_argument('--no-browser', action='store_true', help='Medir solo polling HTTP y parseo (sin Chrome)')
+    parser.add_argument('--json', help='Guardar los resultados en un archivo JSON')
+    parser.add_argument('--compare', help='JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Empeoramiento de p50 tolerado (0.25 = 25%%)')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not args.verbose:
+        # Los logs por cuenta del scraper distorsionan las mediciones
+        for name in ('bank_scraper', 'http_poller', 'history_store', 'mock_portal'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    
+    portal = MockPortal(accounts=args.accounts, latency=args.latency / 1000).start()
+    timer = Timer()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_env(portal, workdir)
+            if not args.no_browser:
+                bench_browser(timer, args.iterations, headless=not args.headed)
+            bench_http(timer, args.iterations, portal)
+    finally:
+        portal.stop()
+    
+    summary = timer.summary()
+    print_report(summary, portal, sys.stdout)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'accounts': args.accounts,
+                'latency_ms': args.latency,
+                'iterations': args.iterations,
+                'phases': summary,
+            }, f, indent=2)
+    
+    if args.compare:
+        regressions = compare(summary, args.compare, args.tolerance)
+        for phase, before, after in regressions:
+            logger.error(f"Regression in {phase}: p50 {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Patrones de URL por tipo de recurso para Network.setBlockedURLs
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.ico', '*.bmp'],
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg', '*.wav'],
+    'stylesheet': ['*.css'],
+}
+
+# Analytics y trackers de terceros que no intervienen en el login ni en la tabla de saldos
+THIRD_PARTY_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*facebook.net*',
+    '*facebook.com/tr*',
+    '*hotjar.com*',
+    '*clarity.ms*',
+    '*newrelic.com*',
+    '*nr-data.net*',
+    '*youtube.com*',
+]
+
+LEAN_ARGUMENTS = [
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-translate',
+    '--no-first-run',
+    '--mute-audio',
+    '--blink-settings=imagesEnabled=false',
+]
+
+def blocked_url_patterns(types, third_party=True, urls=()):
+    """Patrones a bloquear según LEAN_BLOCK_TYPES y LEAN_BLOCK_URLS (ya validados por load_config)"""
+    patterns = []
+    for resource_type in types:
+        patterns.extend(RESOURCE_TYPE_PATTERNS[resource_type])
+    if third_party:
+        patterns.extend(THIRD_PARTY_PATTERNS)
+    patterns.extend(urls)
+    return patterns
+
+def apply_lean_options(chrome_options):
+    chrome_options.page_load_strategy = 'eager'
+    for argument in LEAN_ARGUMENTS:
+        chrome_options.add_argument(argument)
+    chrome_options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    })
+
+def enable_page_stats(chrome_options):
+    # Los eventos de red del log de performance alimentan collect_page_stats
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+def enable_request_blocking(driver, patterns):
+    if not hasattr(driver, 'execute_cdp_cmd'):
+        # webdriver.Remote (CHROMEDRIVER_URL) no expone CDP; quedan solo los flags de arranque
+        logger.warning("Driver does not support CDP, URL blocking disabled")
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    logger.info(f"Blocking {len(patterns)} URL patterns in lean browser profile")
+
+def collect_page_stats(driver):
+    """Bytes transferidos, requests y bloqueos desde la última lectura, más tiempos de carga"""
+    stats = {'requests': 0, 'bytes': 0, 'blocked': 0, 'failed': 0}
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        method = message.get('method')
+        params = message.get('params', {})
+        if method == 'Network.requestWillBeSent':
+            stats['requests'] += 1
+        elif method == 'Network.loadingFinished':
+            stats['bytes'] += int(params.get('encodedDataLength', 0))
+        elif method == 'Network.loadingFailed':
+            if params.get('blockedReason') or 'BLOCKED_BY_CLIENT' in params.get('errorText', ''):
+                stats['blocked'] += 1
+            else:
+                stats['failed'] += 1
+    
+    timing = driver.execute_script(
+        "var nav = performance.getEntriesByType('navigation')[0];"
+        "return nav ? {dom: nav.domContentLoadedEventEnd, load: nav.loadEventEnd} : null;"
+    )
+    if timing:
+        stats['dom_ms'] = round(timing['dom'])
+        stats['load_ms'] = round(timing['load']) if timing['load'] else None
+    return stats
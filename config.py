@@ -0,0 +1,316 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from alert_rules import validate_rule, load_rules, default_rules
+from browser_profile import RESOURCE_TYPE_PATTERNS
+from scheduler import parse_windows
+
+logger = logging.getLogger(__name__)
+
+class ConfigError(Exception):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+@dataclass(frozen=True)
+class AccountConfig:
+    """Credenciales y alertas de una cuenta; name vacío en el modo de una sola cuenta"""
+    name: str
+    bank_url: str
+    username: str
+    password: str
+    threshold: float
+    email_to: str
+    rules: tuple
+    
+    def same_login(self, other):
+        return (self.bank_url, self.username, self.password) == (other.bank_url, other.username, other.password)
+
+@dataclass(frozen=True)
+class Config:
+    """Configuración validada del proceso; se reemplaza entera al recargar, nunca se modifica"""
+    accounts: tuple
+    multi_account: bool = False
+    # Planificación del daemon
+    poll_interval: float = 1800
+    poll_windows: tuple = ()
+    poll_jitter: float = 0.1
+    idle_cycles: int = 0
+    idle_factor: float = 2
+    idle_max_factor: float = 4
+    # Navegador (se aplican al lanzar el próximo navegador)
+    profile_dir: str = ''
+    lean_browser: bool = False
+    lean_block_types: tuple = ('image', 'font', 'media')
+    lean_block_third_party: bool = True
+    lean_block_urls: tuple = ()
+    page_stats: bool = False
+    chromedriver_url: str = ''
+    debugger_address: str = ''
+    max_driver_cycles: int = 0
+    max_driver_rss_mb: float = 0
+    # Verificación
+    phase_retries: int = 2
+    scrape_movements: bool = False
+    movements_max_pages: int = 5
+    max_workers: int = 2
+    page_archive_dir: str = ''
+    # Daemon: separación mínima entre nodos (0 = derivada del intervalo) y endpoint de estado
+    lease_min_interval: float = 0
+    status_port: int = 0
+    health_max_age: float = 0
+    # Archivos de los que salió la configuración, vigilados para recargarla
+    sources: tuple = field(default=(), compare=False)
+    
+    def account(self, name):
+        return next((account for account in self.accounts if account.name == name), None)
+
+def env_flag(name):
+    return os.getenv(name, '').lower() == 'true'
+
+_process_env_keys = None
+_file_keys = set()
+_env_path = None
+_env_lock = threading.Lock()
+
+def load_env():
+    """Carga el archivo .env en el entorno; al volver a llamarla aplica los cambios del archivo
+    
+    Como con load_dotenv, las variables definidas en el entorno real del proceso tienen prioridad
+    sobre el archivo. Las que vienen del archivo se actualizan o se quitan si cambiaron en él.
+    """
+    global _process_env_keys, _file_keys, _env_path
+    from dotenv import find_dotenv, dotenv_values
+    
+    with _env_lock:
+        if _process_env_keys is None:
+            _process_env_keys = set(os.environ)
+            _env_path = find_dotenv()
+        values = dotenv_values(_env_path) if _env_path and os.path.exists(_env_path) else {}
+        keys = {key for key, value in values.items() if value is not None and key not in _process_env_keys}
+        for key in _file_keys - keys:
+            os.environ.pop(key, None)
+        for key in keys:
+            os.environ[key] = values[key]
+        _file_keys = keys
+    return _env_path
+
+def restore_env(snapshot):
+    """Vuelve el entorno al estado guardado antes de una recarga rechazada"""
+    global _file_keys
+    environ, file_keys = snapshot
+    with _env_lock:
+        for key in set(os.environ) - set(environ):
+            del os.environ[key]
+        os.environ.update(environ)
+        _file_keys = file_keys
+
+def load_profiles(path=None):
+    """Carga los perfiles de credenciales desde un archivo JSON o desde BANK_PROFILES"""
+    if path:
+        with open(path, encoding='utf-8') as f:
+            profiles = json.load(f)
+    else:
+        profiles = json.loads(os.getenv('BANK_PROFILES', '[]'))
+    
+    if not isinstance(profiles, list) or not profiles:
+        raise ValueError("Account profiles must be a non-empty JSON list")
+    
+    names = set()
+    for i, profile in enumerate(profiles):
+        if not isinstance(profile, dict):
+            raise ValueError(f"Profile {i+1} must be a JSON object")
+        if not profile.get('username') or not profile.get('password'):
+            raise ValueError(f"Profile {i+1} is missing username or password")
+        # Nombre por defecto para identificar la cuenta en logs y emails
+        profile.setdefault('name', f"perfil{i+1}")
+        if profile['name'] in names:
+            raise ValueError(f"Duplicated profile name: {profile['name']}")
+        names.add(profile['name'])
+    
+    logger.info(f"Loaded {len(profiles)} account profiles")
+    return profiles
+
+def build_account(profile, errors):
+    """Combina un perfil (o {} para la cuenta del entorno) con los valores por defecto del entorno"""
+    name = profile.get('name', '')
+    label = f"Profile {name}" if name else 'Environment'
+    bank_url = profile.get('bank_url') or os.getenv('BANK_URL', '')
+    username = profile.get('username') or os.getenv('BANK_USERNAME', '')
+    password = profile.get('password') or os.getenv('BANK_PASSWORD', '')
+    if not bank_url:
+        errors.append(f"{label}: BANK_URL is not set")
+    if not username or not password:
+        errors.append(f"{label}: BANK_USERNAME / BANK_PASSWORD are not set")
+    
+    threshold = 0.0
+    try:
+        threshold = float(profile.get('threshold', os.getenv('THRESHOLD_AMOUNT', '1000')))
+    except (TypeError, ValueError):
+        errors.append(f"{label}: threshold is not a number")
+    
+    email_to = profile.get('email_to') or os.getenv('EMAIL_TO', '')
+    if isinstance(email_to, list):
+        email_to = ', '.join(str(address) for address in email_to)
+    
+    # Reglas de alerta: las del perfil, las de ALERT_RULES_FILE o la regla por límite total
+    rules = []
+    try:
+        if profile.get('rules'):
+            if not isinstance(profile['rules'], list):
+                raise ValueError("'rules' must be a JSON list")
+            rules = [validate_rule(rule) for rule in profile['rules']]
+        elif os.getenv('ALERT_RULES_FILE'):
+            rules = load_rules(os.getenv('ALERT_RULES_FILE'))
+        else:
+            rules = default_rules(threshold)
+    except (OSError, ValueError) as e:
+        errors.append(f"{label}: invalid alert rules: {str(e)}")
+    
+    return AccountConfig(name, bank_url, username, password, threshold, email_to, tuple(rules))
+
+def load_config(accounts_file=''):
+    """Lee y valida toda la configuración del entorno; lanza ConfigError con todos los problemas"""
+    errors = []
+    multi_account = bool(accounts_file or os.getenv('BANK_PROFILES'))
+    if multi_account:
+        try:
+            profiles = load_profiles(accounts_file)
+        except (OSError, ValueError) as e:
+            raise ConfigError([f"Account profiles: {str(e)}"])
+        accounts = tuple(build_account(profile, errors) for profile in profiles)
+    else:
+        accounts = (build_account({}, errors),)
+    
+    values = {}
+    conversions = (
+        ('poll_interval', 'POLL_INTERVAL', '1800', float),
+        ('poll_jitter', 'POLL_JITTER', '0.1', float),
+        ('idle_cycles', 'IDLE_CYCLES', '0', int),
+        ('idle_factor', 'IDLE_FACTOR', '2', float),
+        ('idle_max_factor', 'IDLE_MAX_FACTOR', '4', float),
+        ('max_driver_cycles', 'DRIVER_MAX_CYCLES', '0', int),
+        ('max_driver_rss_mb', 'DRIVER_MAX_RSS_MB', '0', float),
+        ('phase_retries', 'PHASE_RETRIES', '2', int),
+        ('movements_max_pages', 'MOVEMENTS_MAX_PAGES', '5', int),
+        ('max_workers', 'MAX_WORKERS', '2', int),
+        ('lease_min_interval', 'LEASE_MIN_INTERVAL', '0', float),
+        ('status_port', 'STATUS_PORT', '0', int),
+        ('health_max_age', 'HEALTH_MAX_AGE', '0', float),
+    )
+    for key, var, default, convert in conversions:
+        try:
+            values[key] = convert(os.getenv(var, default))
+        except ValueError:
+            errors.append(f"{var} is not a valid {convert.__name__}: {os.getenv(var)!r}")
+    if values.get('poll_interval', 1) <= 0:
+        errors.append("POLL_INTERVAL must be positive")
+    if not 0 <= values.get('poll_jitter', 0) < 1:
+        errors.append("POLL_JITTER must be between 0 and 1")
+    for key, var in (('lease_min_interval', 'LEASE_MIN_INTERVAL'), ('health_max_age', 'HEALTH_MAX_AGE')):
+        if values.get(key, 0) < 0:
+            errors.append(f"{var} must not be negative")
+    if not 0 <= values.get('status_port', 0) <= 65535:
+        errors.append("STATUS_PORT must be between 0 and 65535")
+    values['lean_block_types'] = tuple(filter(None, (t.strip() for t in os.getenv('LEAN_BLOCK_TYPES', 'image,font,media').split(','))))
+    unknown_types = [t for t in values['lean_block_types'] if t not in RESOURCE_TYPE_PATTERNS]
+    if unknown_types:
+        errors.append(f"Unknown resource type in LEAN_BLOCK_TYPES: {', '.join(unknown_types)} "
+                      f"(valid: {', '.join(RESOURCE_TYPE_PATTERNS)})")
+    try:
+        values['poll_windows'] = tuple(parse_windows(os.getenv('POLL_WINDOWS', '')))
+    except ValueError as e:
+        errors.append(f"POLL_WINDOWS: {str(e)}")
+    
+    if errors:
+        raise ConfigError(errors)
+    
+    lean_browser = env_flag('LEAN_BROWSER')
+    sources = tuple(path for path in (_env_path, accounts_file, os.getenv('ALERT_RULES_FILE')) if path)
+    return Config(
+        accounts=accounts,
+        multi_account=multi_account,
+        profile_dir=os.getenv('CHROME_PROFILE_DIR', ''),
+        lean_browser=lean_browser,
+        # Las estadísticas de red se registran siempre en modo lean para poder comparar
+        page_stats=lean_browser or env_flag('PAGE_STATS'),
+        lean_block_third_party=os.getenv('LEAN_BLOCK_THIRD_PARTY', 'true').lower() == 'true',
+        lean_block_urls=tuple(filter(None, (p.strip() for p in os.getenv('LEAN_BLOCK_URLS', '').split(',')))),
+        chromedriver_url=os.getenv('CHROMEDRIVER_URL', ''),
+        debugger_address=os.getenv('CHROME_DEBUGGER_ADDRESS', ''),
+        scrape_movements=env_flag('SCRAPE_MOVEMENTS'),
+        page_archive_dir=os.getenv('PAGE_ARCHIVE_DIR', ''),
+        sources=sources,
+        **values,
+    )
+
+class ConfigManager:
+    """Mantiene la configuración vigente y la recarga ante SIGHUP o cambios en sus archivos"""
+    
+    def __init__(self, accounts_file=''):
+        self.accounts_file = accounts_file
+        self._reload_requested = threading.Event()
+        self._lock = threading.Lock()
+        load_env()
+        self.current = load_config(accounts_file)
+        self._mtimes = self._source_mtimes(self.current)
+    
+    def _source_mtimes(self, config):
+        mtimes = {}
+        for path in config.sources:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+    
+    def request_reload(self):
+        """Pensado para el handler de SIGHUP: solo marca la recarga, se hace en el próximo ciclo"""
+        self._reload_requested.set()
+    
+    def refresh(self):
+        """Devuelve la configuración nueva si hubo que recargar y cambió algo, o None"""
+        with self._lock:
+            files_changed = self._source_mtimes(self.current) != self._mtimes
+            if not (self._reload_requested.is_set() or files_changed):
+                return None
+            self._reload_requested.clear()
+            
+            snapshot = (dict(os.environ), set(_file_keys))
+            load_env()
+            try:
+                config = load_config(self.accounts_file)
+            except Exception as e:
+                # Cualquier error del archivo nuevo (no solo los de validación) deja la configuración anterior
+                restore_env(snapshot)
+                errors = e.errors if isinstance(e, ConfigError) else [f"{type(e).__name__}: {str(e)}"]
+                for error in errors:
+                    logger.error(f"Configuration reload rejected: {error}")
+                # Se sigue con la configuración anterior; no se reintenta hasta el próximo cambio
+                self._mtimes = self._source_mtimes(self.current)
+                return None
+            
+            self._mtimes = self._source_mtimes(config)
+            if config == self.current:
+                logger.info("Configuration reloaded without changes")
+                return None
+            self.current = config
+            logger.info("Configuration reloaded")
+            return config
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_config_manager(accounts_file=None):
+    """Gestor compartido del proceso; la primera llamada carga y valida la configuración"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ConfigManager(accounts_file if accounts_file is not None else os.getenv('ACCOUNTS_FILE', ''))
+    return _manager
+
+def get_config():
+    return get_config_manager().current
@@ -1,5 +1,9 @@
 import os
+import sys
+import json
 import time
+import argparse
+from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -8,16 +12,102 @@ from selenium.webdriver.chrome.options import Options
 from dotenv import load_dotenv
 import logging
 
+from bank_scraper import REQUIRED_SELECTORS
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SNAPSHOT_VERSION = 1
+
+# Atributos que se comparan entre snapshots: un cambio en cualquiera puede romper al scraper
+SIGNATURE_FIELDS = ('tag', 'id', 'name', 'type', 'visible', 'disabled')
+
+# Una sola llamada devuelve los elementos relevantes de la página y el resultado de cada selector.
+# No se leen valores de inputs ni textos de celdas para no guardar credenciales ni saldos.
+SNAPSHOT_SCRIPT = """
+var selectors = arguments[0];
+var TEXT_TAGS = {a: 1, button: 1, label: 1, th: 1, option: 1, h1: 1, h2: 1, h3: 1};
+function describe(el) {
+    var rect = el.getBoundingClientRect();
+    var tag = el.tagName.toLowerCase();
+    var type = el.getAttribute('type') || '';
+    var withText = TEXT_TAGS[tag] || (tag === 'input' && (type === 'submit' || type === 'button'));
+    return {
+        tag: tag,
+        id: el.id || '',
+        name: el.getAttribute('name') || '',
+        type: type,
+        cls: typeof el.className === 'string' ? el.className : '',
+        headers: el.getAttribute('headers') || '',
+        text: withText ? (el.innerText || el.value || '').trim().slice(0, 80) : '',
+        visible: rect.width > 0 && rect.height > 0,
+        disabled: !!el.disabled
+    };
+}
+var seenHeaders = {};
+var elements = [];
+document.querySelectorAll('form, input, button, select, textarea, a, [id], td[headers], th').forEach(function (el) {
+    // De las celdas de tabla alcanza con una por columna
+    var headers = el.tagName === 'TD' && el.getAttribute('headers');
+    if (headers) {
+        if (seenHeaders[headers]) return;
+        seenHeaders[headers] = true;
+    }
+    if (elements.length < 2000) elements.push(describe(el));
+});
+var results = {};
+Object.keys(selectors).forEach(function (name) {
+    try {
+        var found = document.querySelectorAll(selectors[name]);
+        results[name] = {selector: selectors[name], count: found.length, first: found.length ? describe(found[0]) : null};
+    } catch (e) {
+        results[name] = {selector: selectors[name], count: 0, first: null, error: String(e)};
+    }
+});
+return {url: location.href, title: document.title, elements: elements, selectors: results};
+"""
+
+def diff_snapshot(snapshot, baseline=None):
+    """Problemas de los selectores requeridos: faltantes y, contra un snapshot anterior, cambiados"""
+    problems = []
+    previous = (baseline or {}).get('selectors', {})
+    for name, result in snapshot['selectors'].items():
+        if result.get('error'):
+            problems.append(f"{name}: invalid selector {result['selector']!r} ({result['error']})")
+            continue
+        if not result['count']:
+            problems.append(f"{name}: selector {result['selector']!r} vanished")
+            continue
+        before = previous.get(name)
+        if not before or not before.get('first'):
+            continue
+        if before['selector'] != result['selector']:
+            # El scraper cambió de selector: el snapshot anterior ya no es comparable
+            continue
+        changes = [
+            f"{field} {before['first'].get(field)!r} -> {result['first'].get(field)!r}"
+            for field in SIGNATURE_FIELDS
+            if before['first'].get(field) != result['first'].get(field)
+        ]
+        if changes:
+            problems.append(f"{name}: selector {result['selector']!r} changed ({', '.join(changes)})")
+    return problems
+
+def vanished_ids(snapshot, baseline):
+    """Ids del snapshot anterior que ya no están (informativo: pueden anticipar un rediseño)"""
+    current = {element['id'] for element in snapshot['elements'] if element['id']}
+    return sorted({element['id'] for element in baseline.get('elements', []) if element['id']} - current)
+
 class MacroDebugScraper:
     def __init__(self):
         self.driver = None
         self.bank_url = os.getenv('BANK_URL', '')
-        
+        self.username = os.getenv('BANK_USERNAME', '')
+        self.password = os.getenv('BANK_PASSWORD', '')
+        self.snapshots = {}
+    
     def setup_driver(self, headless=False):
         chrome_options = Options()
         if headless:
@@ -26,97 +116,183 @@ class MacroDebugScraper:
         chrome_options.add_argument('--disable-dev-shm-usage')
         chrome_options.add_argument('--disable-gpu')
         
+        # Sin espera implícita: cada búsqueda que no encuentra nada costaría 10 segundos
         self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(10)
-        
-    def open_bank_page(self):
+    
+    def open_page(self, url):
         try:
-            logger.info(f"Opening bank page: {self.bank_url}")
-            self.driver.get(self.bank_url)
+            logger.info(f"Opening page: {url}")
+            self.driver.get(url)
+            WebDriverWait(self.driver, 15).until(
+                lambda driver: driver.execute_script("return document.readyState") == 'complete'
+            )
             
-            logger.info("Page loaded successfully")
             logger.info(f"Current URL: {self.driver.current_url}")
             logger.info(f"Page title: {self.driver.title}")
-            
-            time.sleep(5)
-            
             return True
-            
+        
         except Exception as e:
-            logger.error(f"Failed to open bank page: {str(e)}")
+            logger.error(f"Failed to open page: {str(e)}")
             return False
     
+    def take_snapshot(self, page, save_pages=None):
+        """Captura el DOM relevante de la página actual en una sola llamada a execute_script"""
+        started = time.perf_counter()
+        result = self.driver.execute_script(SNAPSHOT_SCRIPT, REQUIRED_SELECTORS.get(page, {}))
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'page': page,
+            'captured_at': datetime.now().isoformat(timespec='seconds'),
+            **result,
+        }
+        self.snapshots[page] = snapshot
+        logger.info(f"Snapshot '{page}': {len(snapshot['elements'])} elements "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        
+        if save_pages:
+            os.makedirs(save_pages, exist_ok=True)
+            with open(os.path.join(save_pages, f"{page}.html"), 'w', encoding='utf-8') as f:
+                f.write(self.driver.page_source)
+        return snapshot
+    
     def find_login_elements(self):
+        """Vista rápida para depurar a mano: inputs, botones y submits de la página actual"""
+        snapshot = self.take_snapshot('login')
+        for element in snapshot['elements']:
+            if element['tag'] in ('input', 'button'):
+                logger.info(f"{element['tag']}: id='{element['id']}', name='{element['name']}', "
+                            f"type='{element['type']}', class='{element['cls']}', text='{element['text']}'")
+        return snapshot
+    
+    def capture_live(self, login=False, save_pages=None):
+        """Snapshot del portal real; con login=True recorre también el paso de contraseña y la home"""
+        if not self.open_page(self.bank_url):
+            return False
+        self.take_snapshot('login', save_pages)
+        if not login:
+            return True
+        
+        login_page = REQUIRED_SELECTORS['login']
+        password_page = REQUIRED_SELECTORS['login_password']
+        wait = WebDriverWait(self.driver, 15)
         try:
-            logger.info("Searching for login elements...")
-            
-            # Buscar campos de input
-            inputs = self.driver.find_elements(By.TAG_NAME, "input")
-            logger.info(f"Found {len(inputs)} input elements")
-            
-            for i, input_elem in enumerate(inputs):
-                elem_id = input_elem.get_attribute('id')
-                elem_name = input_elem.get_attribute('name')
-                elem_type = input_elem.get_attribute('type')
-                elem_class = input_elem.get_attribute('class')
-                
-                logger.info(f"Input {i+1}: id='{elem_id}', name='{elem_name}', type='{elem_type}', class='{elem_class}'")
-            
-            # Buscar botones
-            buttons = self.driver.find_elements(By.TAG_NAME, "button")
-            logger.info(f"Found {len(buttons)} button elements")
-            
-            for i, button in enumerate(buttons):
-                button_id = button.get_attribute('id')
-                button_class = button.get_attribute('class')
-                button_text = button.text
-                
-                logger.info(f"Button {i+1}: id='{button_id}', class='{button_class}', text='{button_text}'")
-            
-            # Buscar elementos con type=submit
-            submits = self.driver.find_elements(By.CSS_SELECTOR, "input[type='submit']")
-            logger.info(f"Found {len(submits)} submit elements")
-            
-            for i, submit in enumerate(submits):
-                submit_id = submit.get_attribute('id')
-                submit_class = submit.get_attribute('class')
-                submit_value = submit.get_attribute('value')
-                
-                logger.info(f"Submit {i+1}: id='{submit_id}', class='{submit_class}', value='{submit_value}'")
-            
+            self.driver.find_element(By.CSS_SELECTOR, login_page['username']).send_keys(self.username)
+            self.driver.find_element(By.CSS_SELECTOR, login_page['user_button']).click()
+            wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, password_page['password'])))
+        except Exception as e:
+            logger.error(f"Could not reach the password step: {str(e)}")
             return True
-            
+        self.take_snapshot('login_password', save_pages)
+        
+        try:
+            self.driver.find_element(By.CSS_SELECTOR, password_page['password']).send_keys(self.password)
+            self.driver.find_element(By.CSS_SELECTOR, password_page['login_button']).click()
+            wait.until(EC.url_changes(self.bank_url))
+            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, REQUIRED_SELECTORS['home']['logout'])))
         except Exception as e:
-            logger.error(f"Error finding login elements: {str(e)}")
-            return False
+            logger.error(f"Could not reach the home page: {str(e)}")
+            return True
+        self.take_snapshot('home', save_pages)
+        
+        try:
+            self.driver.find_element(By.CSS_SELECTOR, REQUIRED_SELECTORS['home']['logout']).click()
+        except Exception as e:
+            logger.warning(f"Logout failed: {str(e)}")
+        return True
     
-    def debug_session(self):
+    def capture_saved(self, pages_dir):
+        """Snapshot de páginas guardadas (<página>.html) para correr en CI sin acceso al portal"""
+        for page in REQUIRED_SELECTORS:
+            path = os.path.join(pages_dir, f"{page}.html")
+            if not os.path.exists(path):
+                logger.warning(f"No saved page for '{page}' ({path})")
+                continue
+            if self.open_page('file://' + os.path.abspath(path)):
+                self.take_snapshot(page)
+        return bool(self.snapshots)
+    
+    def report(self, output_dir=None, baseline_dir=None):
+        """Guarda los snapshots y devuelve la cantidad de selectores faltantes o cambiados"""
+        total = 0
+        for page, snapshot in self.snapshots.items():
+            baseline = None
+            if baseline_dir:
+                baseline = load_snapshot(os.path.join(baseline_dir, f"{page}.json"))
+            
+            problems = diff_snapshot(snapshot, baseline)
+            for problem in problems:
+                logger.error(f"[{page}] {problem}")
+            if not problems:
+                logger.info(f"[{page}] {len(snapshot['selectors'])} required selectors OK")
+            if baseline:
+                missing_ids = vanished_ids(snapshot, baseline)
+                if missing_ids:
+                    logger.warning(f"[{page}] ids no longer present: {', '.join(missing_ids[:20])}")
+            total += len(problems)
+            
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                path = os.path.join(output_dir, f"{page}.json")
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False, indent=2)
+                logger.info(f"[{page}] snapshot saved to {path}")
+        
+        missing_pages = [page for page in REQUIRED_SELECTORS if page not in self.snapshots]
+        if missing_pages:
+            logger.info(f"Pages not captured: {', '.join(missing_pages)}")
+        return total
+    
+    def debug_session(self, args):
+        headless = args.headless or args.pages is not None
         try:
-            self.setup_driver(headless=False)  # Ventana visible para debug
+            self.setup_driver(headless=headless)
             
-            if not self.open_bank_page():
-                return False
-                
-            if not self.find_login_elements():
-                return False
-                
-            logger.info("Debug session completed. Check the logs above for element details.")
+            if args.pages:
+                captured = self.capture_saved(args.pages)
+            else:
+                captured = self.capture_live(login=args.login, save_pages=args.save_pages)
+            if not captured:
+                return 2
             
-            input("Press Enter to close the browser...")
+            problems = self.report(args.output, args.baseline)
             
-            return True
+            # Solo se espera al usuario con ventana visible y una terminal interactiva
+            if not headless and sys.stdin.isatty():
+                input("Press Enter to close the browser...")
             
+            return 1 if problems else 0
+        
         except Exception as e:
             logger.error(f"Error during debug session: {str(e)}")
-            return False
-            
+            return 2
+        
         finally:
             if self.driver:
                 self.driver.quit()
 
+def load_snapshot(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Ignoring snapshot {path} with version {snapshot.get('version')} (expected {SNAPSHOT_VERSION})")
+        return None
+    return snapshot
+
 def main():
-    scraper = MacroDebugScraper()
-    scraper.debug_session()
+    parser = argparse.ArgumentParser(description='Snapshot del DOM del portal y detección de selectores rotos')
+    parser.add_argument('--headless', action='store_true', help='Sin ventana (implícito con --pages)')
+    parser.add_argument('--login', action='store_true', help='Hacer login con las credenciales del .env para capturar también la home')
+    parser.add_argument('--pages', help='Directorio con páginas guardadas (login.html, login_password.html, home.html)')
+    parser.add_argument('--save-pages', help='Guardar el HTML de cada página capturada en este directorio')
+    parser.add_argument('--output', default='snapshots', help='Directorio donde guardar los snapshots JSON')
+    parser.add_argument('--baseline', help='Directorio con snapshots anteriores a comparar')
+    args = parser.parse_args()
+    
+    # 0: sin cambios, 1: selectores faltantes o cambiados, 2: no se pudo capturar
+    sys.exit(MacroDebugScraper().debug_session(args))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
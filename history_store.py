@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    account TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    currency TEXT NOT NULL,
+    balance REAL NOT NULL,
+    PRIMARY KEY (account, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts);
+CREATE TABLE IF NOT EXISTS movements (
+    account TEXT NOT NULL,
+    id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount REAL,
+    balance REAL,
+    seen_at INTEGER NOT NULL,
+    PRIMARY KEY (account, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS movement_watermarks (
+    account TEXT PRIMARY KEY,
+    movement_id TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+"""
+
+class BalanceHistory:
+    """Historial de saldos por cuenta en SQLite, con escrituras agrupadas en lotes"""
+    
+    def __init__(self, path, batch_size=50, max_delay=300):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._pending = []
+        self._first_pending_at = None
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+    
+    def record(self, balance_data, profile='', ts=None):
+        """Agrega las lecturas de un ciclo; se escriben al completar el lote"""
+        ts = int(ts if ts is not None else time.time())
+        rows = [
+            (account_key(profile, account['name']), ts, account.get('currency', 'ARS'), account['balance'])
+            for account in balance_data['accounts']
+        ]
+        with self._lock:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.extend(rows)
+            due = (
+                len(self._pending) >= self.batch_size or
+                time.monotonic() - self._first_pending_at >= self.max_delay
+            )
+        if due:
+            self.flush()
+    
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO readings (account, ts, currency, balance) VALUES (?, ?, ?, ?)',
+                    rows
+                )
+        logger.info(f"Stored {len(rows)} balance readings in {self.path}")
+    
+    def has_reading_near(self, account, ts, window):
+        """Si ya hay una lectura de la cuenta a menos de window segundos de ts (escrita o en el lote)"""
+        with self._lock:
+            if any(key == account and abs(pending_ts - ts) <= window for key, pending_ts, _, _ in self._pending):
+                return True
+            row = self.conn.execute(
+                'SELECT 1 FROM readings WHERE account = ? AND ts BETWEEN ? AND ? LIMIT 1',
+                (account, int(ts - window), int(ts + window))
+            ).fetchone()
+        return row is not None
+    
+    def close(self):
+        self.flush()
+        self.conn.close()
+    
+    def store_movements(self, account, movements):
+        now = int(time.time())
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO movements (account, id, date, description, currency, amount, balance, seen_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (account, m['id'], m['date'], m['description'], m['currency'], m['amount'], m['balance'], now)
+                    for m in movements
+                ]
+            )
+    
+    def has_movement(self, account, movement_id):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT 1 FROM movements WHERE account = ? AND id = ?', (account, movement_id)
+            ).fetchone()
+        return row is not None
+    
+    def movement_watermark(self, account):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT movement_id FROM movement_watermarks WHERE account = ?', (account,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def set_movement_watermark(self, account, movement_id):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO movement_watermarks (account, movement_id, updated_at) VALUES (?, ?, ?)',
+                (account, movement_id, int(time.time()))
+            )
+    
+    def accounts(self):
+        return [row[0] for row in self.conn.execute('SELECT DISTINCT account FROM readings ORDER BY account')]
+    
+    def range(self, account, since=None, until=None):
+        query, params = self._where(account, since, until)
+        return self.conn.execute(
+            f'SELECT account, ts, currency, balance FROM readings {query} ORDER BY account, ts', params
+        ).fetchall()
+    
+    def last(self, account, n=1):
+        rows = self.conn.execute(
+            'SELECT account, ts, currency, balance FROM readings WHERE account = ? ORDER BY ts DESC LIMIT ?',
+            (account, n)
+        ).fetchall()
+        return rows[::-1]
+    
+    def stats(self, account, since=None, until=None):
+        query, params = self._where(account, since, until)
+        return self.conn.execute(
+            f'SELECT account, COUNT(*), MIN(balance), MAX(balance), MIN(ts), MAX(ts) '
+            f'FROM readings {query} GROUP BY account ORDER BY account', params
+        ).fetchall()
+    
+    def _where(self, account, since, until):
+        clauses, params = [], []
+        if account:
+            clauses.append('account = ?')
+            params.append(account)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(int(since))
+        if until is not None:
+            clauses.append('ts < ?')
+            params.append(int(until))
+        return ('WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+def account_key(profile, name):
+    return f"{profile}/{name}" if profile else name
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    """Historial compartido del proceso, o None si HISTORY_DB está vacío"""
+    global _history
+    path = os.getenv('HISTORY_DB', 'balance_history.db')
+    if not path:
+        return None
+    with _history_lock:
+        if _history is None:
+            _history = BalanceHistory(path, batch_size=int(os.getenv('HISTORY_BATCH_SIZE', '50')))
+            atexit.register(_history.close)
+    return _history
+
+def parse_time(value):
+    return datetime.fromisoformat(value).timestamp()
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+def history_main(argv=None):
+    """Consulta y exporta el historial: python bank_scraper.py --history [opciones]"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='bank_scraper.py --history', description='Consultar el historial de saldos')
+    parser.add_argument('--db', default=os.getenv('HISTORY_DB') or 'balance_history.db')
+    parser.add_argument('--account', help='Cuenta a consultar (por defecto todas)')
+    parser.add_argument('--since', type=parse_time, help='Desde (ISO, ej. 2024-01-31 o 2024-01-31T09:00)')
+    parser.add_argument('--until', type=parse_time, help='Hasta, excluido (ISO)')
+    parser.add_argument('--last', type=int, help='Últimas N lecturas por cuenta')
+    parser.add_argument('--stats', action='store_true', help='Mostrar cantidad, mínimo y máximo por cuenta')
+    parser.add_argument('--list-accounts', action='store_true', help='Listar las cuentas registradas')
+    parser.add_argument('--export', choices=['csv', 'json'], help='Formato de exportación')
+    parser.add_argument('--output', help='Archivo de salida (por defecto stdout)')
+    args = parser.parse_args(argv)
+    
+    if not os.path.exists(args.db):
+        parser.error(f"History database not found: {args.db}")
+    history = BalanceHistory(args.db)
+    
+    try:
+        if args.list_accounts:
+            for account in history.accounts():
+                print(account)
+            return
+        
+        if args.stats:
+            for account, count, low, high, first, last in history.stats(args.account, args.since, args.until):
+                print(f"{account}: {count} lecturas entre {format_time(first)} y {format_time(last)}, "
+                      f"mín ${low:,.2f}, máx ${high:,.2f}")
+            return
+        
+        if args.last:
+            accounts = [args.account] if args.account else history.accounts()
+            rows = [row for account in accounts for row in history.last(account, args.last)]
+        else:
+            rows = history.range(args.account, args.since, args.until)
+        
+        output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        try:
+            write_rows(rows, args.export, output)
+        finally:
+            if args.output:
+                output.close()
+    finally:
+        history.close()
+
+def write_rows(rows, export_format, output):
+    if export_format == 'csv':
+        import csv
+        writer = csv.writer(output)
+        writer.writerow(['account', 'timestamp', 'currency', 'balance'])
+        for account, ts, currency, balance in rows:
+            writer.writerow([account, format_time(ts), currency, balance])
+    elif export_format == 'json':
+        for account, ts, currency, balance in rows:
+            output.write(json.dumps({
+                'account': account, 'timestamp': format_time(ts), 'currency': currency, 'balance': balance
+            }) + '\n')
+    else:
+        for account, ts, currency, balance in rows:
+            output.write(f"{format_time(ts)}  {account}  {currency} {balance:,.2f}\n")
+
+if __name__ == "__main__":
+    history_main()
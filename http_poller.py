@@ -0,0 +1,122 @@
+import logging
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+BALANCE_HEADER = '_Saldo disponible'
+LOGIN_FIELD_ID = 'textField1'
+
+class SessionExpired(Exception):
+    pass
+
+class BalanceTableParser(HTMLParser):
+    """Extrae etiqueta y texto de saldo de cada fila con una celda '_Saldo disponible'"""
+    
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.has_login_form = False
+        self._cells = None
+        self._cell = None
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if attrs.get('id') == LOGIN_FIELD_ID:
+            self.has_login_form = True
+        if tag == 'tr':
+            self._cells = []
+        elif tag in ('td', 'th') and self._cells is not None:
+            self._cell = {'tag': tag, 'headers': attrs.get('headers') or '', 'text': []}
+            self._cells.append(self._cell)
+    
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            self._cell = None
+        elif tag == 'tr' and self._cells is not None:
+            self._finish_row(self._cells)
+            self._cells = None
+    
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell['text'].append(data)
+    
+    def _finish_row(self, cells):
+        for cell in cells:
+            cell['text'] = ' '.join(''.join(cell['text']).split())
+        
+        balance_cells = [c for c in cells if c['headers'] == BALANCE_HEADER]
+        if not balance_cells:
+            return
+        
+        # Misma heurística que BALANCE_TABLE_SCRIPT en bank_scraper
+        label_cell = next(
+            (c for c in cells if c['tag'] == 'th' or 'Cuenta' in c['headers']),
+            cells[0]
+        )
+        for cell in balance_cells:
+            self.rows.append({
+                'label': label_cell['text'] if label_cell is not cell else '',
+                'text': cell['text']
+            })
+
+def parse_balance_html(html):
+    """Devuelve (filas de saldo, hay formulario de login) a partir del HTML de la página"""
+    parser = BalanceTableParser()
+    parser.feed(html)
+    parser.close()
+    return parser.rows, parser.has_login_form
+
+class HttpBalancePoller:
+    """Consulta la página de saldos por HTTP reutilizando las cookies de una sesión de Selenium"""
+    
+    def __init__(self, user_agent, timeout=15):
+        self.balance_url = None
+        self.timeout = timeout
+        # HTML de la última respuesta, para el archivo de páginas
+        self.last_html = None
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        # Una sola conexión keep-alive al portal alcanza para los polls
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    @property
+    def ready(self):
+        return self.balance_url is not None
+    
+    def load_cookies(self, driver, balance_url):
+        """Copia las cookies autenticadas del driver a la sesión HTTP"""
+        self.session.cookies.clear()
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain'),
+                path=cookie.get('path', '/')
+            )
+        self.balance_url = balance_url
+        logger.info(f"Exported {len(self.session.cookies)} session cookies for HTTP polling")
+    
+    def invalidate(self):
+        self.balance_url = None
+        self.session.cookies.clear()
+    
+    def fetch_rows(self):
+        response = self.session.get(self.balance_url, timeout=self.timeout)
+        
+        if response.status_code in (401, 403):
+            raise SessionExpired(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        
+        self.last_html = response.text
+        rows, has_login_form = parse_balance_html(response.text)
+        if has_login_form:
+            raise SessionExpired("Login form returned")
+        if not rows:
+            # Sin tabla de saldos no se puede confirmar que la sesión siga vigente
+            raise SessionExpired(f"No balance table at {response.url}")
+        return rows
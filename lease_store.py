@@ -0,0 +1,163 @@
+import os
+import json
+import math
+import time
+import fcntl
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+class LeaseStore:
+    """Leases por cuenta en un directorio compartido: cada cuenta la verifica un solo nodo por intervalo"""
+    
+    def __init__(self, directory, node_id=None, ttl=900, handoff_grace=None):
+        self.directory = directory
+        self.node_id = node_id or socket.gethostname()
+        # Un lease no devuelto (nodo caído a mitad de ciclo) vence a los ttl segundos
+        self.ttl = ttl
+        # Tiempo extra que se respeta al último nodo que verificó la cuenta si sigue vivo (None: medio intervalo)
+        self.handoff_grace = handoff_grace
+        self.leases_dir = os.path.join(directory, 'leases')
+        self.nodes_dir = os.path.join(directory, 'nodes')
+        os.makedirs(self.leases_dir, exist_ok=True)
+        os.makedirs(self.nodes_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.held = {}
+    
+    def _path(self, base, key, suffix):
+        return os.path.join(base, quote(key, safe='') + suffix)
+    
+    @contextmanager
+    def _locked(self, account):
+        # flock sobre un archivo aparte: el lease se reescribe con os.replace y cambiaría de inodo
+        with open(self._path(self.leases_dir, account, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _read(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable lease file {path}: {str(e)}")
+            return {}
+    
+    def _write(self, path, data):
+        tmp_path = f"{path}.{self.node_id}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    
+    def heartbeat(self, now=None):
+        """Marca el nodo como vivo; los nodos sin heartbeat por más de ttl dejan de contar"""
+        now = time.time() if now is None else now
+        self._write(self._path(self.nodes_dir, self.node_id, '.json'), {
+            'node': self.node_id, 'pid': os.getpid(), 'heartbeat_at': now, 'leases': sorted(self.held),
+        })
+    
+    def live_nodes(self, now=None):
+        now = time.time() if now is None else now
+        nodes = set()
+        for filename in os.listdir(self.nodes_dir):
+            if not filename.endswith('.json'):
+                continue
+            node = self._read(os.path.join(self.nodes_dir, filename))
+            if node.get('node') and now - node.get('heartbeat_at', 0) <= self.ttl:
+                nodes.add(node['node'])
+        nodes.add(self.node_id)
+        return nodes
+    
+    def claim(self, accounts, min_interval, now=None):
+        """Toma los leases de las cuentas que le tocan a este nodo en este ciclo y devuelve sus nombres
+        
+        Una cuenta se toma si nadie la tiene, si no se verificó en los últimos min_interval segundos y,
+        cuando la verificó otro nodo que sigue vivo, si ya pasó además el margen de traspaso. Cada nodo
+        toma como máximo su parte (cuentas / nodos vivos), así que al caer un nodo el resto absorbe
+        sus cuentas y al sumarse uno nuevo las cuentas se redistribuyen de a poco.
+        """
+        now = time.time() if now is None else now
+        live = self.live_nodes(now)
+        share = math.ceil(len(accounts) / len(live))
+        grace = self.handoff_grace if self.handoff_grace is not None else min_interval / 2
+        
+        # Primero las cuentas que verificó este nodo, para conservar sus sesiones abiertas
+        leases = {account: self._read(self._path(self.leases_dir, account, '.json')) for account in accounts}
+        ordered = sorted(accounts, key=lambda account: leases[account].get('last_node') != self.node_id)
+        
+        claimed = []
+        for account in ordered:
+            if len(claimed) >= share:
+                break
+            path = self._path(self.leases_dir, account, '.json')
+            with self._locked(account):
+                lease = self._read(path)
+                holder = lease.get('node')
+                if holder and holder != self.node_id and lease.get('expires_at', 0) > now:
+                    continue
+                last_checked = lease.get('last_checked_at')
+                since_check = now - last_checked if last_checked else math.inf
+                if since_check < min_interval:
+                    continue
+                last_node = lease.get('last_node')
+                if last_node and last_node != self.node_id and last_node in live and since_check < min_interval + grace:
+                    continue
+                if holder and holder != self.node_id:
+                    logger.warning(f"Taking over expired lease for '{account}' from node {holder}")
+                lease.update({'node': self.node_id, 'acquired_at': now, 'expires_at': now + self.ttl})
+                self._write(path, lease)
+            claimed.append(account)
+        
+        with self._lock:
+            for account in claimed:
+                self.held[account] = now
+        logger.info(f"Node {self.node_id} claimed {len(claimed)}/{len(accounts)} accounts "
+                    f"({len(live)} live nodes, share {share})")
+        return claimed
+    
+    def release(self, account, checked=True):
+        """Devuelve el lease; con checked=True la cuenta cuenta como verificada desde que se tomó"""
+        with self._lock:
+            acquired_at = self.held.pop(account, None)
+        if acquired_at is None:
+            return
+        path = self._path(self.leases_dir, account, '.json')
+        with self._locked(account):
+            lease = self._read(path)
+            if lease.get('node') != self.node_id:
+                logger.warning(f"Lease for '{account}' was taken over by node {lease.get('node')} before release")
+                return
+            lease.update({'node': None, 'expires_at': 0})
+            if checked:
+                lease.update({'last_checked_at': acquired_at, 'last_node': self.node_id})
+            self._write(path, lease)
+    
+    def release_all(self, checked=False):
+        with self._lock:
+            accounts = list(self.held)
+        for account in accounts:
+            self.release(account, checked=checked)
+    
+    def last_node(self, account):
+        return self._read(self._path(self.leases_dir, account, '.json')).get('last_node')
+
+def get_lease_store():
+    """Store de leases configurado por LEASE_DIR, o None si el daemon corre en un solo nodo"""
+    directory = os.getenv('LEASE_DIR', '')
+    if not directory:
+        return None
+    grace = os.getenv('LEASE_HANDOFF_GRACE', '')
+    return LeaseStore(
+        directory,
+        node_id=os.getenv('LEASE_NODE_ID', '') or None,
+        ttl=float(os.getenv('LEASE_TTL', '900')),
+        handoff_grace=float(grace) if grace else None,
+    )
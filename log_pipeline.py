@@ -0,0 +1,218 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Contexto de cada registro: se toma en el thread que loguea, no en el del listener
+cycle_id_var = contextvars.ContextVar('cycle_id', default=None)
+account_var = contextvars.ContextVar('account', default=None)
+phase_var = contextvars.ContextVar('phase', default=None)
+
+# Importes con moneda ("$ 1.234,56", "ARS 1234.5", "U$S 100"); un número suelto no se enmascara
+AMOUNT_RE = re.compile(r'(U\$S|US\$|USD|EUR|€|ARS|\$)\s*-?\s*\d[\d.,]*', re.IGNORECASE)
+CREDENTIAL_RE = re.compile(r'((?:password|passwd|token|secret)\s*[=:]\s*)\S+', re.IGNORECASE)
+
+MASK_POLICIES = ('credentials', 'balances')
+
+def new_cycle_id():
+    return uuid.uuid4().hex[:12]
+
+@contextmanager
+def log_context(cycle_id=None, account=None, phase=None):
+    """Fija cycle_id, cuenta y/o fase para los registros emitidos dentro del bloque"""
+    tokens = []
+    for var, value in ((cycle_id_var, cycle_id), (account_var, account), (phase_var, phase)):
+        if value is not None:
+            tokens.append((var, var.set(value)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+class ContextQueueHandler(QueueHandler):
+    """Encola el registro con su contexto; el formateo y la escritura quedan para el listener"""
+    
+    def prepare(self, record):
+        record.cycle_id = cycle_id_var.get()
+        record.account = account_var.get()
+        record.phase = phase_var.get()
+        return super().prepare(record)
+
+class MaskingPolicy:
+    """Enmascara credenciales conocidas y/o importes en el mensaje según LOG_MASK"""
+    
+    def __init__(self, policies=('credentials',)):
+        self.policies = set(policies)
+        self._secrets_re = None
+    
+    def set_secrets(self, secrets):
+        # Los más largos primero, por si uno contiene a otro
+        secrets = sorted({secret for secret in secrets if secret and len(secret) >= 3}, key=len, reverse=True)
+        self._secrets_re = re.compile('|'.join(re.escape(secret) for secret in secrets)) if secrets else None
+    
+    def mask(self, message):
+        if 'credentials' in self.policies:
+            message = CREDENTIAL_RE.sub(r'\1***', message)
+            if self._secrets_re is not None:
+                message = self._secrets_re.sub('***', message)
+        if 'balances' in self.policies:
+            message = AMOUNT_RE.sub(lambda match: f"{match.group(1)} ***", message)
+        return message
+
+class MaskingQueueListener(QueueListener):
+    """Aplica la política de enmascarado una sola vez por registro, antes de todos los handlers"""
+    
+    def __init__(self, log_queue, *handlers, policy=None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.policy = policy
+    
+    def prepare(self, record):
+        if self.policy is not None:
+            record.msg = self.policy.mask(record.getMessage())
+            record.args = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key in ('cycle_id', 'account', 'phase'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rota por tamaño o por antigüedad y comprime con gzip los archivos rotados"""
+    
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, max_age=86400, backup_count=10):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        # La antigüedad se cuenta desde que se empezó el archivo, no desde que arrancó este proceso:
+        # si no, una ejecución por cron o un daemon que se reinicia nunca rotarían por antigüedad
+        self.rollover_at = (self._started_at() or time.time()) + max_age if max_age else None
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._compress
+    
+    def _started_at(self):
+        """Hora del primer registro del archivo actual (ts de su primera línea JSON), o None si no existe"""
+        try:
+            with open(self.baseFilename, encoding='utf-8') as f:
+                first_line = f.readline()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            first_line = ''
+        try:
+            return datetime.fromisoformat(json.loads(first_line)['ts']).timestamp()
+        except (ValueError, KeyError, TypeError):
+            # Archivo vacío o que no escribió este handler: mtime, como TimedRotatingFileHandler
+            try:
+                stat = os.stat(self.baseFilename)
+            except OSError:
+                return None
+            return getattr(stat, 'st_birthtime', stat.st_mtime)
+    
+    @staticmethod
+    def _compress(source, dest):
+        import gzip
+        import shutil
+        
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+    
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+    
+    def doRollover(self):
+        super().doRollover()
+        if self.max_age:
+            self.rollover_at = time.time() + self.max_age
+
+_listener = None
+_policy = None
+_setup_lock = threading.Lock()
+
+def setup_logging():
+    """Reemplaza los handlers del root por una cola: formateo, enmascarado y escritura van en otro thread"""
+    global _listener, _policy
+    with _setup_lock:
+        if _listener is not None:
+            return _policy
+        
+        mask = os.getenv('LOG_MASK', 'credentials').lower()
+        policies = [] if mask in ('', 'none') else [policy.strip() for policy in mask.split(',')]
+        unknown = set(policies) - set(MASK_POLICIES)
+        _policy = MaskingPolicy([policy for policy in policies if policy in MASK_POLICIES])
+        
+        console = logging.StreamHandler(sys.stderr)
+        if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+            console.setFormatter(JsonFormatter())
+        else:
+            console.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+        handlers = [console]
+        
+        log_file = os.getenv('LOG_FILE', '')
+        if log_file:
+            file_handler = CompressingRotatingFileHandler(
+                log_file,
+                max_bytes=int(float(os.getenv('LOG_MAX_MB', '10')) * 1024 * 1024),
+                max_age=float(os.getenv('LOG_MAX_AGE_HOURS', '24')) * 3600,
+                backup_count=int(os.getenv('LOG_BACKUP_COUNT', '10')),
+            )
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        
+        # Cola sin límite: loguear nunca bloquea al thread del scraping
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(ContextQueueHandler(log_queue))
+        root.setLevel(getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO))
+        
+        _listener = MaskingQueueListener(log_queue, *handlers, policy=_policy)
+        _listener.start()
+        atexit.register(stop_logging)
+    
+    if unknown:
+        logging.getLogger(__name__).warning(f"Unknown LOG_MASK policies ignored: {', '.join(sorted(unknown))}")
+    return _policy
+
+def set_log_secrets(secrets):
+    """Valores que nunca deben aparecer en los logs (contraseñas, usuarios); se pueden actualizar al recargar"""
+    if _policy is not None:
+        _policy.set_secrets(secrets)
+
+def stop_logging():
+    """Vacía la cola y cierra los archivos (al salir del proceso)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
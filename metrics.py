@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+from log_pipeline import log_context
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+COUNTER_HELP = {
+    'checks_total': 'Verificaciones completas por resultado',
+    'retries_total': 'Reintentos de verificación',
+    'phase_retries_total': 'Reintentos de una fase sobre el driver vivo',
+    'login_failures_total': 'Logins fallidos',
+    'parse_failures_total': 'Saldos que no se pudieron parsear',
+    'selector_not_found_total': 'Esperas que agotaron el timeout por paso',
+    'page_bytes_total': 'Bytes transferidos por página',
+    'blocked_requests_total': 'Requests bloqueados por el perfil lean',
+}
+
+GAUGE_HELP = {
+    'driver_rss_bytes': 'RSS del árbol de procesos del navegador (chromedriver + Chrome)',
+    'driver_processes': 'Procesos del árbol del navegador',
+    'driver_cycles': 'Ciclos ejecutados sobre el navegador actual',
+    'daemon_rss_bytes': 'RSS del proceso del daemon',
+}
+
+def escape_label_value(value):
+    # Formato de texto de Prometheus: barra invertida, comillas y saltos de línea se escapan
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+class Metrics:
+    """Spans de tiempo por fase y contadores, exportables en formato Prometheus y JSON lines"""
+    
+    def __init__(self, jsonl_path='', prom_path=''):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._in_flight = {}
+    
+    @contextmanager
+    def span(self, phase, **labels):
+        """Mide la duración de una fase; el estado es 'error' si la fase lanza una excepción"""
+        key = labels.get('profile', 'default')
+        with self._lock:
+            self._in_flight.setdefault(key, []).append(phase)
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            # Los logs emitidos dentro de la fase llevan su nombre
+            with log_context(phase=phase):
+                yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            with self._lock:
+                stack = self._in_flight.get(key, [])
+                if phase in stack:
+                    stack.remove(phase)
+            self.observe(phase, time.perf_counter() - started, status=status, **labels)
+    
+    def in_flight(self):
+        """Fase más interna en curso por perfil"""
+        with self._lock:
+            return {key: stack[-1] for key, stack in self._in_flight.items() if stack}
+    
+    def observe(self, phase, seconds, status='ok', **labels):
+        key = (phase, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0})
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+        self._write_event({'phase': phase, 'duration': round(seconds, 4), 'status': status, **labels})
+    
+    def phase_totals(self):
+        """Tiempo acumulado por fase (todas las etiquetas), en orden de primera observación"""
+        totals = {}
+        with self._lock:
+            for (phase, _), histogram in self._histograms.items():
+                totals[phase] = totals.get(phase, 0.0) + histogram['sum']
+        return list(totals.items())
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._write_event({'counter': name, 'value': value, **labels})
+    
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+        self._write_event({'gauge': name, 'value': value, **labels})
+    
+    def _write_event(self, event):
+        if not self.jsonl_path:
+            return
+        event = {'ts': round(time.time(), 3), **event}
+        try:
+            with self._lock, open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write metrics event: {str(e)}")
+    
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items())
+        
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"macro_scraper_{name}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{format_labels(labels)} {value:g}")
+        
+        for (name, labels), value in gauges:
+            metric = f"macro_scraper_{name}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# HELP {metric} {GAUGE_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{format_labels(labels)} {value:g}")
+        
+        metric = 'macro_scraper_phase_duration_seconds'
+        if histograms:
+            lines.append(f"# HELP {metric} Duración de cada fase del ciclo")
+            lines.append(f"# TYPE {metric} histogram")
+        for (phase, labels), histogram in histograms:
+            labels = (('phase', phase),) + labels
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                lines.append(f"{metric}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{metric}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{metric}_count{format_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+    
+    def export(self):
+        """Escribe el archivo Prometheus (para el textfile collector de node_exporter)"""
+        if not self.prom_path:
+            return
+        tmp_path = self.prom_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, self.prom_path)
+        except OSError as e:
+            logger.warning(f"Could not export metrics: {str(e)}")
+    
+    def serve(self, port, host='127.0.0.1'):
+        """Sirve /metrics en un thread aparte"""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                data = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics(
+                jsonl_path=os.getenv('METRICS_JSONL', ''),
+                prom_path=os.getenv('METRICS_PROM_FILE', ''),
+            )
+            if os.getenv('METRICS_PORT'):
+                _metrics.serve(int(os.getenv('METRICS_PORT')))
+    return _metrics
+
+def timed(phase):
+    """Decorador para métodos de BankScraper: mide la fase con la etiqueta del perfil"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with get_metrics().span(phase, profile=self.name or 'default'):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,252 @@
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+BASE_PATH = '/bancainternet/'
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>Macro - Banca Internet (mock)</title>
+<link rel="stylesheet" href="/static/portal.css">
+</head>
+<body>
+<img src="/static/banner.png" alt="banner">
+<div id="step1">
+    <input id="textField1" name="username" type="text">
+    <button id="processCustomerLogin" type="button">Continuar</button>
+</div>
+<form id="step2" method="post" action="login" style="display: none">
+    <input id="login_username" name="username" type="hidden">
+    <input id="login_textField1" name="password" type="password">
+    <input id="processSystem_UserLogin" type="submit" value="Ingresar">
+</form>
+<script>
+document.getElementById('processCustomerLogin').addEventListener('click', function () {
+    var username = document.getElementById('textField1').value;
+    fetch('customer', {method: 'POST', body: username}).then(function () {
+        document.getElementById('login_username').value = username;
+        document.getElementById('step1').style.display = 'none';
+        document.getElementById('step2').style.display = 'block';
+    });
+});
+</script>
+</body>
+</html>
+"""
+
+HOME_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>Macro - Posición consolidada (mock)</title>
+<link rel="stylesheet" href="/static/portal.css">
+</head>
+<body>
+<img src="/static/banner.png" alt="banner">
+<button id="widgetLogoutBtn" type="button" onclick="location.href='logout'">Salir</button>
+<table>
+<tr><th id="_Cuenta">Cuenta</th><th id="_Saldo disponible">Saldo disponible</th></tr>
+{rows}
+</table>
+</body>
+</html>
+"""
+
+ROW = '<tr><td headers="_Cuenta"><a href="movimientos?cuenta={index}">{label}</a></td><td headers="_Saldo disponible">{amount}</td></tr>'
+
+MOVEMENTS_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Macro - Movimientos (mock)</title></head>
+<body>
+<button id="widgetLogoutBtn" type="button" onclick="location.href='logout'">Salir</button>
+<table>
+<tr><th id="_Fecha">Fecha</th><th id="_Descripción">Descripción</th><th id="_Importe">Importe</th><th id="_Saldo">Saldo</th></tr>
+{rows}
+</table>
+{next_link}
+</body>
+</html>
+"""
+
+MOVEMENT_ROW = (
+    '<tr><td headers="_Fecha">{date}</td><td headers="_Descripción">{description}</td>'
+    '<td headers="_Importe">{amount}</td><td headers="_Saldo">{balance}</td></tr>'
+)
+
+MOVEMENTS_PAGE_SIZE = 20
+
+def format_amount(value, currency='$'):
+    """1234567.89 -> '$ 1.234.567,89' (formato argentino)"""
+    sign = '-' if value < 0 else ''
+    integer, decimals = f"{abs(value):,.2f}".split('.')
+    return f"{sign}{currency} {integer.replace(',', '.')},{decimals}"
+
+class MockPortal:
+    """Portal de Banca Internet simulado con el mismo contrato de DOM que usa BankScraper"""
+    
+    def __init__(self, host='127.0.0.1', port=0, accounts=3, latency=0.0, asset_bytes=200_000, seed=0,
+                 movements=60):
+        self.accounts = accounts
+        self.movements = movements
+        self.latency = latency
+        self.asset = bytes(asset_bytes)
+        self.sessions = set()
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='mock-portal', daemon=True)
+        self._thread.start()
+        logger.info(f"Mock portal listening on {self.url} ({self.accounts} accounts, {self.latency * 1000:.0f} ms latency)")
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def balances(self):
+        rows = []
+        for i in range(self.accounts):
+            currency = 'U$S' if i % 4 == 3 else '$'
+            value = round(self._random.uniform(-5_000, 2_500_000), 2)
+            rows.append(ROW.format(index=i, label=f"CA {currency} 300-{i:06d}/0", amount=format_amount(value, currency)))
+        return '\n'.join(rows)
+    
+    def movements_page(self, account, page):
+        """Movimientos deterministas del más nuevo al más viejo, paginados"""
+        generator = random.Random(account)
+        balance = 1_000_000.0
+        start = page * MOVEMENTS_PAGE_SIZE
+        rows = []
+        for i in range(self.movements):
+            amount = round(generator.uniform(-50_000, 50_000), 2)
+            reference = generator.randint(1000, 9999)
+            if i >= start + MOVEMENTS_PAGE_SIZE:
+                break
+            if i >= start:
+                rows.append(MOVEMENT_ROW.format(
+                    date=f"{28 - i % 28:02d}/{12 - (i // 28) % 12:02d}/2024",
+                    description=f"TRANSFERENCIA {reference}",
+                    amount=format_amount(amount),
+                    balance=format_amount(balance),
+                ))
+            balance -= amount
+        has_next = start + MOVEMENTS_PAGE_SIZE < self.movements
+        next_link = f'<a rel="next" href="movimientos?cuenta={account}&amp;pagina={page + 1}">Siguiente</a>' if has_next else ''
+        return MOVEMENTS_PAGE.format(rows='\n'.join(rows), next_link=next_link)
+    
+    def _handler_class(self):
+        portal = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+            
+            def do_GET(self):
+                portal._before_request()
+                path = self.path.split('?', 1)[0]
+                if path == BASE_PATH:
+                    if self._session():
+                        return self._redirect(BASE_PATH + 'home')
+                    return self._send(200, LOGIN_PAGE)
+                if path == BASE_PATH + 'home':
+                    if not self._session():
+                        return self._redirect(BASE_PATH)
+                    return self._send(200, HOME_PAGE.format(rows=portal.balances()))
+                if path == BASE_PATH + 'movimientos':
+                    if not self._session():
+                        return self._redirect(BASE_PATH)
+                    query = parse_qs(self.path.partition('?')[2])
+                    account = int(query.get('cuenta', ['0'])[0])
+                    page = int(query.get('pagina', ['0'])[0])
+                    return self._send(200, portal.movements_page(account, page))
+                if path == BASE_PATH + 'logout':
+                    with portal._lock:
+                        portal.sessions.discard(self._session())
+                    return self._redirect(BASE_PATH, cookie='session=; Max-Age=0; Path=/')
+                if path == '/static/banner.png':
+                    return self._send(200, portal.asset, 'image/png')
+                if path == '/static/portal.css':
+                    return self._send(200, 'body { font-family: sans-serif; }', 'text/css')
+                self._send(404, 'Not found')
+            
+            def do_POST(self):
+                portal._before_request()
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8')
+                if self.path == BASE_PATH + 'customer':
+                    return self._send(200, 'ok', 'text/plain')
+                if self.path == BASE_PATH + 'login':
+                    form = parse_qs(body)
+                    if not form.get('username') or not form.get('password'):
+                        return self._redirect(BASE_PATH)
+                    session = uuid.uuid4().hex
+                    with portal._lock:
+                        portal.sessions.add(session)
+                    return self._redirect(BASE_PATH + 'home', cookie=f"session={session}; Path=/")
+                self._send(404, 'Not found')
+            
+            def _session(self):
+                for part in (self.headers.get('Cookie') or '').split(';'):
+                    name, _, value = part.strip().partition('=')
+                    if name == 'session' and value in portal.sessions:
+                        return value
+                return None
+            
+            def _redirect(self, location, cookie=None):
+                self.send_response(302)
+                self.send_header('Location', location)
+                if cookie:
+                    self.send_header('Set-Cookie', cookie)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def _send(self, status, content, content_type='text/html; charset=utf-8'):
+                data = content.encode('utf-8') if isinstance(content, str) else content
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        
+        return Handler
+    
+    def _before_request(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+def main():
+    parser = argparse.ArgumentParser(description='Portal de Banca Internet simulado para pruebas offline')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help='Latencia por request en milisegundos')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    portal = MockPortal(port=args.port, accounts=args.accounts, latency=args.latency / 1000).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        portal.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import hashlib
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+from balance_parser import parse_amount, parse_currency
+
+logger = logging.getLogger(__name__)
+
+# Como en la tabla de saldos, las celdas se identifican por su atributo headers
+DATE_HEADER = os.getenv('MOVEMENTS_DATE_HEADER', '_Fecha')
+DESCRIPTION_HEADER = os.getenv('MOVEMENTS_DESCRIPTION_HEADER', '_Descripción')
+AMOUNT_HEADER = os.getenv('MOVEMENTS_AMOUNT_HEADER', '_Importe')
+BALANCE_HEADER = os.getenv('MOVEMENTS_BALANCE_HEADER', '_Saldo')
+LINK_SELECTOR = os.getenv('MOVEMENTS_LINK_SELECTOR', 'a')
+NEXT_SELECTOR = os.getenv('MOVEMENTS_NEXT_SELECTOR', 'a[rel="next"]')
+
+# Abre los movimientos de la fila N de la tabla de saldos
+OPEN_ACCOUNT_SCRIPT = """
+var cell = document.querySelectorAll(arguments[0])[arguments[1]];
+var link = cell && cell.closest('tr').querySelector(arguments[2]);
+if (!link) return false;
+link.click();
+return true;
+"""
+
+# Filas de la página actual (celdas por headers) y si hay página siguiente
+PAGE_SCRIPT = """
+var rows = Array.from(document.querySelectorAll('td[headers="' + arguments[0] + '"]')).map(function (dateCell) {
+    var cells = {};
+    dateCell.closest('tr').querySelectorAll('td[headers]').forEach(function (td) {
+        cells[td.getAttribute('headers')] = td.innerText.trim();
+    });
+    return cells;
+});
+var next = document.querySelector(arguments[1]);
+return {rows: rows, hasNext: !!next && !next.classList.contains('disabled')};
+"""
+
+def movement_id(cells, occurrence):
+    """Id estable a partir del contenido de la fila; occurrence distingue filas idénticas"""
+    key = '|'.join(f"{name}={cells[name]}" for name in sorted(cells)) + f"|{occurrence}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+def parse_row(cells, occurrence, default_currency):
+    amount_text = cells.get(AMOUNT_HEADER, '')
+    return {
+        'id': movement_id(cells, occurrence),
+        'date': cells.get(DATE_HEADER, ''),
+        'description': cells.get(DESCRIPTION_HEADER, ''),
+        'amount': parse_amount(amount_text),
+        'currency': parse_currency(amount_text, default=default_currency),
+        'balance': parse_amount(cells.get(BALANCE_HEADER, '')),
+    }
+
+def open_account_movements(driver, waits, balance_selector, index):
+    if not driver.execute_script(OPEN_ACCOUNT_SCRIPT, balance_selector, index, LINK_SELECTOR):
+        raise LookupError(f"No movements link for account {index + 1} ({LINK_SELECTOR})")
+    waits.element(driver, 'movements_table', (By.CSS_SELECTOR, f'td[headers="{DATE_HEADER}"]'))
+
+def iter_movements(driver, waits, default_currency='ARS', max_pages=20):
+    """Generador de movimientos del más nuevo al más viejo; solo pagina cuando se consume la página"""
+    seen = {}
+    for page in range(1, max_pages + 1):
+        result = driver.execute_script(PAGE_SCRIPT, DATE_HEADER, NEXT_SELECTOR)
+        for cells in result['rows']:
+            signature = tuple(sorted(cells.items()))
+            seen[signature] = seen.get(signature, 0) + 1
+            yield parse_row(cells, seen[signature], default_currency)
+        
+        if not result['hasNext']:
+            return
+        # Solo se recuerda la página actual: memoria constante aunque el historial sea largo
+        seen = {}
+        first_cell = driver.find_element(By.CSS_SELECTOR, f'td[headers="{DATE_HEADER}"]')
+        waits.element(driver, 'movements_next', (By.CSS_SELECTOR, NEXT_SELECTOR), clickable=True).click()
+        waits.until(driver, 'movements_page', EC.staleness_of(first_cell), f"page {page + 1} of movements")
+    logger.warning(f"Stopped paging movements after {max_pages} pages")
+
+def collect_new_movements(movements, is_known, store, batch_size=100, keep=20):
+    """Consume el generador hasta el primer movimiento ya guardado, escribiendo en lotes.
+    
+    Devuelve (id del más nuevo, cantidad de nuevos, los primeros `keep` para la notificación).
+    """
+    newest_id = None
+    recent = []
+    batch = []
+    count = 0
+    for movement in movements:
+        if is_known(movement['id']):
+            break
+        if newest_id is None:
+            newest_id = movement['id']
+        if len(recent) < keep:
+            recent.append(movement)
+        batch.append(movement)
+        count += 1
+        if len(batch) >= batch_size:
+            store(batch)
+            batch = []
+    if batch:
+        store(batch)
+    return newest_id, count, recent
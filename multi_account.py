@@ -0,0 +1,59 @@
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Sin importar bank_scraper: cuando se ejecuta como script es __main__ y se cargaría dos veces;
+# quien llama pasa la función de verificación y la fábrica de scrapers
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+def check_profile(profile, check, make_scraper, headless=True, scraper=None):
+    """Ejecuta la verificación completa (login, saldo, logout) de un perfil"""
+    started = time.monotonic()
+    scraper = scraper or make_scraper(profile)
+    success = check(headless=headless, scraper=scraper)
+    elapsed = time.monotonic() - started
+    logger.info(f"[{profile.name}] Check finished in {elapsed:.1f}s (success={success})")
+    return success
+
+def run_parallel_checks(profiles, check, make_scraper, headless=True, max_workers=None, scrapers=None):
+    """Verifica varias cuentas en paralelo con un pool acotado de navegadores
+    
+    check(headless, scraper) es la verificación con reintentos y make_scraper(profile) crea el
+    scraper de las cuentas que no tienen uno en scrapers.
+    """
+    if max_workers is None:
+        max_workers = get_config().max_workers
+    # Cada worker mantiene un Chrome abierto: el pool limita la memoria total
+    max_workers = max(1, min(max_workers, len(profiles)))
+    scrapers = scrapers or {}
+    
+    logger.info(f"Checking {len(profiles)} accounts with {max_workers} browser workers")
+    started = time.monotonic()
+    results = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scraper') as executor:
+        futures = {
+            # Cada worker hereda el contexto de logs del ciclo (cycle_id)
+            executor.submit(
+                contextvars.copy_context().run, check_profile, profile, check, make_scraper, headless,
+                scrapers.get(profile.name),
+            ): profile.name
+            for profile in profiles
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"[{name}] Unexpected error: {str(e)}")
+                results[name] = False
+    
+    elapsed = time.monotonic() - started
+    failed = [name for name, ok in results.items() if not ok]
+    logger.info(f"Checked {len(profiles)} accounts in {elapsed:.1f}s ({len(failed)} failed)")
+    if failed:
+        logger.warning(f"Failed accounts: {', '.join(sorted(failed))}")
+    return results
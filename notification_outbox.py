@@ -0,0 +1,280 @@
+import os
+import json
+import math
+import time
+import uuid
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class NotificationOutbox:
+    """Cola de alertas en disco enviada por un worker en segundo plano con una conexión SMTP reutilizada"""
+    
+    def __init__(self, directory, email_from, email_password, smtp_host='smtp.gmail.com', smtp_port=587,
+                 starttls=True, max_attempts=10, base_backoff=30, max_backoff=3600, idle_timeout=300,
+                 coalesce_window=10):
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, 'failed')
+        self.email_from = email_from
+        self.email_password = email_password
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.starttls = starttls
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.coalesce_window = coalesce_window
+        self._flushing = False
+        self._flush_done = threading.Event()
+        self._stopped = False
+        self._server = None
+        self._last_used = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(self.failed_directory, exist_ok=True)
+    
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+            self._thread.start()
+    
+    def stop(self, drain_timeout=0):
+        """Detiene el worker, esperando hasta drain_timeout segundos a que se vacíe la cola
+        
+        Solo la primera llamada hace algo: el daemon lo detiene al salir y después corre el atexit.
+        """
+        if self._stopped:
+            return
+        self._stopped = True
+        if drain_timeout:
+            self.drain(drain_timeout)
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+    
+    def drain(self, timeout):
+        """Un último intento para todo lo pendiente, sin esperar ventanas de agrupado ni backoff
+        
+        Vuelve en cuanto termina ese intento (o a los timeout segundos): lo que siga fallando queda
+        en disco para la próxima ejecución, sin dormir el resto del timeout.
+        """
+        if self._pending_files():
+            self._flush_done.clear()
+            self._flushing = True
+            self.start()
+            self._wakeup.set()
+            self._flush_done.wait(timeout)
+        pending = len(self._pending_files())
+        if pending:
+            logger.warning(f"{pending} notifications still queued in {self.directory}")
+        return pending == 0
+    
+    def enqueue(self, email_to, subject, body):
+        """Guarda la alerta en disco y despierta al worker; no espera el envío"""
+        alert = {
+            'to': email_to,
+            'subject': subject,
+            'body': body,
+            'created_at': time.time(),
+            'attempts': 0,
+            # Se retiene unos segundos para juntar las alertas de cuentas que terminan casi a la vez
+            'next_attempt_at': time.time() + self.coalesce_window,
+        }
+        name = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.json"
+        self._write(os.path.join(self.directory, name), alert)
+        logger.info(f"Notification queued: {subject}")
+        self.start()
+        self._wakeup.set()
+    
+    def _write(self, path, alert):
+        # Escritura atómica: el worker solo lista archivos .json completos
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(alert, f)
+        os.replace(tmp_path, path)
+    
+    def _pending_files(self):
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith('.json')
+        )
+    
+    def _load_pending(self):
+        alerts = []
+        for path in self._pending_files():
+            try:
+                with open(path, encoding='utf-8') as f:
+                    alerts.append((path, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Discarding unreadable notification {path}: {str(e)}")
+                os.replace(path, os.path.join(self.failed_directory, os.path.basename(path)))
+        return alerts
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delay = self._process_due()
+            except Exception as e:
+                logger.error(f"Notification worker error: {str(e)}")
+                delay = self.base_backoff
+                if self._flushing:
+                    # drain() no debe esperar todo su timeout por un error del worker
+                    self._flushing = False
+                    self._flush_done.set()
+            
+            if self._server and time.monotonic() - self._last_used >= self.idle_timeout:
+                self._close_connection()
+            
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+        self._close_connection()
+    
+    def _process_due(self):
+        """Envía las alertas vencidas agrupadas por destinatario; devuelve la espera hasta la próxima"""
+        flushing = self._flushing
+        # Durante drain() todo lo pendiente cuenta como vencido, una sola vez
+        now = math.inf if flushing else time.time()
+        pending = self._load_pending()
+        due_recipients = {alert['to'] for _, alert in pending if alert['next_attempt_at'] <= now}
+        groups = {}
+        next_due = None
+        for path, alert in pending:
+            # Las alertas nuevas de un destinatario con un email por salir viajan en ese mismo email
+            if alert['next_attempt_at'] <= now or (alert['to'] in due_recipients and not alert['attempts']):
+                groups.setdefault(alert['to'], []).append((path, alert))
+            elif next_due is None or alert['next_attempt_at'] < next_due:
+                next_due = alert['next_attempt_at']
+        
+        for email_to, batch in groups.items():
+            retry_at = self._send_batch(email_to, batch)
+            if retry_at is not None and (next_due is None or retry_at < next_due):
+                next_due = retry_at
+        
+        if flushing:
+            self._flushing = False
+            self._flush_done.set()
+        if next_due is None:
+            return self.idle_timeout
+        return max(0.1, next_due - time.time())
+    
+    def _send_batch(self, email_to, batch):
+        msg = self._build_message(email_to, [alert for _, alert in batch])
+        try:
+            self._connection().send_message(msg)
+            self._last_used = time.monotonic()
+        except Exception as e:
+            logger.error(f"Failed to send notification to {email_to}: {str(e)}")
+            self._close_connection()
+            return self._schedule_retry(batch)
+        
+        for path, _ in batch:
+            os.remove(path)
+        logger.info(f"Notification sent successfully to {email_to} ({len(batch)} alerts)")
+        return None
+    
+    def _schedule_retry(self, batch):
+        retry_at = None
+        for path, alert in batch:
+            alert['attempts'] += 1
+            if alert['attempts'] >= self.max_attempts:
+                logger.error(f"Giving up on notification after {alert['attempts']} attempts: {alert['subject']}")
+                os.replace(path, os.path.join(self.failed_directory, os.path.basename(path)))
+                continue
+            # Backoff exponencial con tope
+            backoff = min(self.base_backoff * 2 ** (alert['attempts'] - 1), self.max_backoff)
+            alert['next_attempt_at'] = time.time() + backoff
+            self._write(path, alert)
+            retry_at = alert['next_attempt_at'] if retry_at is None else min(retry_at, alert['next_attempt_at'])
+        if retry_at is not None:
+            logger.info(f"Retrying notification in {retry_at - time.time():.0f}s")
+        return retry_at
+    
+    def _build_message(self, email_to, alerts):
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
+        msg = MIMEMultipart()
+        msg['From'] = self.email_from
+        msg['To'] = email_to
+        if len(alerts) == 1:
+            msg['Subject'] = alerts[0]['subject']
+            body = alerts[0]['body']
+        else:
+            # Varias alertas pendientes para el mismo destinatario van en un solo email
+            msg['Subject'] = f"Balance Alerts: {len(alerts)} alertas"
+            body = '\n\n'.join(f"=== {alert['subject']} ===\n{alert['body']}" for alert in alerts)
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+    
+    def _connection(self):
+        """Reutiliza la conexión autenticada si sigue viva, o abre una nueva"""
+        import smtplib
+        
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._close_connection()
+        
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.email_password:
+            server.login(self.email_from, self.email_password)
+        self._server = server
+        logger.info(f"Connected to SMTP server {self.smtp_host}:{self.smtp_port}")
+        return server
+    
+    def _close_connection(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox():
+    """Outbox compartido del proceso; al salir espera un tiempo acotado a que se vacíe"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = NotificationOutbox(
+                os.getenv('OUTBOX_DIR', 'outbox'),
+                os.getenv('EMAIL_FROM', ''),
+                os.getenv('EMAIL_PASSWORD', ''),
+                smtp_host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+                smtp_port=int(os.getenv('SMTP_PORT', '587')),
+                starttls=os.getenv('SMTP_STARTTLS', 'true').lower() == 'true',
+                max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10')),
+                coalesce_window=float(os.getenv('OUTBOX_COALESCE_WINDOW', '10')),
+            )
+            # Entregar lo que quedó pendiente de ejecuciones anteriores
+            _outbox.start()
+            atexit.register(_outbox.stop, float(os.getenv('OUTBOX_DRAIN_TIMEOUT', '30')))
+    return _outbox
+
+def resume_outbox():
+    """Arranca el worker si quedaron alertas de una ejecución anterior (p. ej. SMTP caído al salir)"""
+    directory = os.getenv('OUTBOX_DIR', 'outbox')
+    try:
+        pending = any(name.endswith('.json') for name in os.listdir(directory))
+    except OSError:
+        return None
+    if not pending:
+        return None
+    logger.info(f"Resuming queued notifications from {directory}")
+    return get_outbox()
@@ -0,0 +1,248 @@
+import os
+import sys
+import time
+import zlib
+import atexit
+import hashlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from balance_parser import balance_from_rows
+from history_store import BalanceHistory, account_key, parse_time, format_time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    sha256 TEXT PRIMARY KEY,
+    dictionary TEXT,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dictionaries (
+    kind TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    ts INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_kind_ts ON pages (kind, ts);
+"""
+
+def object_path(directory, sha256):
+    return os.path.join(directory, 'objects', sha256[:2], sha256 + '.z')
+
+def read_object(directory, sha256, dictionary=None):
+    """Descomprime un objeto; los comprimidos contra un diccionario necesitan sus bytes"""
+    with open(object_path(directory, sha256), 'rb') as f:
+        data = f.read()
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+class PageArchive:
+    """HTML crudo de cada ciclo, comprimido y deduplicado por contenido (sha256)
+    
+    Las páginas de un mismo tipo son casi idénticas entre ciclos: la primera de cada tipo se guarda
+    como diccionario de zlib y las siguientes se comprimen contra ella, así que cada página nueva
+    ocupa poco más que sus diferencias (saldos, tokens de sesión, fecha).
+    """
+    
+    def __init__(self, directory, level=9):
+        self.directory = directory
+        self.level = level
+        self._lock = threading.Lock()
+        self._dictionaries = {}
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+    
+    def store(self, account, kind, html, url='', ts=None):
+        """Archiva una página y devuelve su sha256; el contenido repetido no se vuelve a escribir"""
+        ts = int(ts if ts is not None else time.time())
+        data = html.encode('utf-8')
+        sha256 = hashlib.sha256(data).hexdigest()
+        
+        with self._lock:
+            known = self.conn.execute('SELECT 1 FROM objects WHERE sha256 = ?', (sha256,)).fetchone()
+            if not known:
+                row = self.conn.execute('SELECT sha256 FROM dictionaries WHERE kind = ?', (kind,)).fetchone()
+                # La primera página de cada tipo pasa a ser su diccionario
+                dictionary_sha = row[0] if row else sha256
+                if dictionary_sha == sha256:
+                    compressor = zlib.compressobj(self.level)
+                else:
+                    compressor = zlib.compressobj(self.level, zdict=self._dictionary(dictionary_sha))
+                compressed = compressor.compress(data) + compressor.flush()
+                
+                path = object_path(self.directory, sha256)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+            
+            with self.conn:
+                if not known and dictionary_sha == sha256:
+                    self.conn.execute('INSERT INTO dictionaries (kind, sha256) VALUES (?, ?)', (kind, sha256))
+                if not known:
+                    self.conn.execute(
+                        'INSERT INTO objects (sha256, dictionary, size, stored_size) VALUES (?, ?, ?, ?)',
+                        (sha256, None if dictionary_sha == sha256 else dictionary_sha, len(data), len(compressed))
+                    )
+                self.conn.execute(
+                    'INSERT INTO pages (ts, account, kind, sha256, url) VALUES (?, ?, ?, ?, ?)',
+                    (ts, account, kind, sha256, url)
+                )
+        return sha256
+    
+    def _dictionary(self, sha256):
+        if sha256 not in self._dictionaries:
+            self._dictionaries[sha256] = read_object(self.directory, sha256)
+        return self._dictionaries[sha256]
+    
+    def load(self, sha256):
+        with self._lock:
+            row = self.conn.execute('SELECT dictionary FROM objects WHERE sha256 = ?', (sha256,)).fetchone()
+            if row is None:
+                raise KeyError(sha256)
+            dictionary = self._dictionary(row[0]) if row[0] else None
+        return read_object(self.directory, sha256, dictionary).decode('utf-8')
+    
+    def entries(self, kind=None, account=None, since=None, until=None):
+        """(ts, cuenta, tipo, sha256, diccionario) de las páginas archivadas, en orden cronológico"""
+        clauses, params = [], []
+        for clause, value in (('p.kind = ?', kind), ('p.account = ?', account), ('p.ts >= ?', since), ('p.ts < ?', until)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(int(value) if clause.startswith('p.ts') else value)
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        with self._lock:
+            return self.conn.execute(
+                f'SELECT p.ts, p.account, p.kind, p.sha256, o.dictionary FROM pages p '
+                f'JOIN objects o ON o.sha256 = p.sha256 {where} ORDER BY p.ts',
+                params
+            ).fetchall()
+    
+    def stats(self):
+        with self._lock:
+            pages = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            objects, size, stored = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM objects'
+            ).fetchone()
+        return {'pages': pages, 'objects': objects, 'size': size, 'stored_size': stored}
+    
+    def close(self):
+        self.conn.close()
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_page_archive(directory=None):
+    """Archivo compartido del proceso, o None si PAGE_ARCHIVE_DIR está vacío"""
+    global _archive
+    if directory is None:
+        directory = os.getenv('PAGE_ARCHIVE_DIR', '')
+    if not directory:
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive(directory)
+            atexit.register(_archive.close)
+    return _archive
+
+_worker_dictionaries = {}
+
+def reparse_object(task):
+    """Worker del pool: descomprime una página y corre el parser de saldos sobre ella"""
+    from http_poller import parse_balance_html
+    
+    directory, sha256, dictionary_sha = task
+    dictionary = None
+    if dictionary_sha:
+        if dictionary_sha not in _worker_dictionaries:
+            _worker_dictionaries[dictionary_sha] = read_object(directory, dictionary_sha)
+        dictionary = _worker_dictionaries[dictionary_sha]
+    
+    html = read_object(directory, sha256, dictionary).decode('utf-8')
+    rows, has_login_form = parse_balance_html(html)
+    balance_data, failures = balance_from_rows(rows)
+    return sha256, balance_data, failures, has_login_form
+
+def reparse_main(argv=None):
+    """Vuelve a parsear las páginas archivadas: python bank_scraper.py --reparse [opciones]"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='bank_scraper.py --reparse', description='Re-parsear el archivo de páginas')
+    parser.add_argument('--archive', default=os.getenv('PAGE_ARCHIVE_DIR') or 'page_archive')
+    parser.add_argument('--kind', default='balance', help='Tipo de página (por defecto balance; "all" para todas)')
+    parser.add_argument('--account', help='Perfil a re-parsear (por defecto todos)')
+    parser.add_argument('--since', type=parse_time, help='Desde (ISO, ej. 2024-01-31 o 2024-01-31T09:00)')
+    parser.add_argument('--until', type=parse_time, help='Hasta, excluido (ISO)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Procesos del pool')
+    parser.add_argument('--backfill', action='store_true', help='Guardar las lecturas obtenidas en el historial')
+    parser.add_argument('--db', default=os.getenv('HISTORY_DB') or 'balance_history.db', help='Historial para --backfill')
+    parser.add_argument('--match-window', type=float, default=300,
+                        help='Segundos alrededor de cada página en los que una lectura existente evita el backfill')
+    parser.add_argument('--verbose', action='store_true', help='Mostrar cada página que no se pudo parsear')
+    args = parser.parse_args(argv)
+    
+    if not os.path.exists(os.path.join(args.archive, 'index.db')):
+        parser.error(f"Page archive not found: {args.archive}")
+    archive = PageArchive(args.archive)
+    started = time.perf_counter()
+    try:
+        entries = archive.entries(None if args.kind == 'all' else args.kind, args.account, args.since, args.until)
+    finally:
+        archive.close()
+    
+    # Cada contenido distinto se parsea una sola vez aunque se haya archivado en muchos ciclos
+    tasks = list({sha256: (args.archive, sha256, dictionary) for _, _, _, sha256, dictionary in entries}.values())
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        chunksize = max(1, len(tasks) // (max(1, args.workers) * 4))
+        results = {result[0]: result[1:] for result in executor.map(reparse_object, tasks, chunksize=chunksize)}
+    
+    parsed = failed = login_pages = backfilled = 0
+    history = BalanceHistory(args.db) if args.backfill else None
+    try:
+        for ts, account, kind, sha256, _ in entries:
+            balance_data, failures, has_login_form = results[sha256]
+            if has_login_form:
+                login_pages += 1
+            if balance_data is None or failures:
+                failed += 1
+                if args.verbose:
+                    texts = ', '.join(repr(text) for _, text in failures) or 'no balance rows'
+                    print(f"{format_time(ts)}  {account or 'default'}  {kind}  {sha256[:12]}: {texts}")
+            if balance_data is not None:
+                parsed += 1
+                # La lectura del ciclo se guardó con su propia hora, segundos después de archivar la página:
+                # solo se completan los huecos (p. ej. ciclos previos a HISTORY_DB o lecturas perdidas)
+                if history is not None and not any(
+                    history.has_reading_near(account_key(account, item['name']), ts, args.match_window)
+                    for item in balance_data['accounts']
+                ):
+                    history.record(balance_data, profile=account, ts=ts)
+                    backfilled += 1
+    finally:
+        if history is not None:
+            history.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"Re-parsed {len(entries)} pages ({len(tasks)} unique) in {elapsed:.2f}s with {args.workers} workers: "
+          f"{parsed} with balances, {failed} with unparsed rows, {login_pages} login pages")
+    if history is not None:
+        print(f"Backfilled {backfilled} readings into {args.db} ({parsed - backfilled} already recorded)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    from config import load_env
+    load_env()
+    sys.exit(reparse_main())
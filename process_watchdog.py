@@ -0,0 +1,134 @@
+import os
+import logging
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+BROWSER_PROCESS_NAMES = ('chromedriver', 'chrome', 'chromium', 'google-chrome', 'headless_shell')
+
+# Flags que chromedriver agrega al Chrome que lanza: distinguen un navegador de Selenium del de escritorio
+AUTOMATION_FLAGS = ('--enable-automation', '--test-type=webdriver')
+
+# Puerto de chromedriver cuando se lanza sin --port
+CHROMEDRIVER_DEFAULT_PORT = 9515
+
+def service_port(url):
+    """Puerto de CHROMEDRIVER_URL, o None si no se usa un chromedriver externo"""
+    if not url:
+        return None
+    from urllib.parse import urlparse
+    
+    parsed = urlparse(url if '://' in url else f"http://{url}")
+    try:
+        return parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError:
+        return None
+
+def chromedriver_port(cmdline):
+    for i, arg in enumerate(cmdline):
+        if arg.startswith('--port='):
+            value = arg.split('=', 1)[1]
+        elif arg == '--port' and i + 1 < len(cmdline):
+            value = cmdline[i + 1]
+        else:
+            continue
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return CHROMEDRIVER_DEFAULT_PORT
+
+def driver_root_pid(driver):
+    """PID del chromedriver lanzado por Selenium (None con webdriver.Remote o sin driver)"""
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    return process.pid if process else None
+
+def process_tree(pid):
+    """El proceso y todos sus descendientes (chromedriver -> Chrome -> renderers, GPU, etc.)"""
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+def tree_memory(pid):
+    """RSS total en bytes y cantidad de procesos del árbol"""
+    rss = 0
+    processes = process_tree(pid)
+    for proc in processes:
+        try:
+            rss += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return rss, len(processes)
+
+def own_rss():
+    return psutil.Process().memory_info().rss
+
+def kill_processes(processes, timeout=3):
+    """terminate() y, a los que no terminen en timeout segundos, kill()"""
+    alive = []
+    for proc in processes:
+        try:
+            proc.terminate()
+            alive.append(proc)
+        except psutil.NoSuchProcess:
+            continue
+    _, alive = psutil.wait_procs(alive, timeout=timeout)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            continue
+    return len(processes)
+
+def is_orphan_browser_process(proc, username, keep_port=None):
+    """chromedriver o Chrome de Selenium del mismo usuario cuyo padre ya no existe
+    
+    keep_port es el puerto del chromedriver externo de CHROMEDRIVER_URL: también tiene ppid 1 si se
+    lanzó en segundo plano, pero es un servicio y no un resto de una ejecución anterior.
+    """
+    info = proc.info
+    name = (info.get('name') or '').lower()
+    if not name.startswith(BROWSER_PROCESS_NAMES) or info.get('username') != username:
+        return False
+    # Si el daemon corre como PID 1 (contenedor sin init) sus chromedriver tienen ppid 1 y no son huérfanos
+    if info.get('ppid') == os.getpid():
+        return False
+    if info.get('ppid') not in (0, 1):
+        try:
+            if proc.parent() is not None:
+                return False
+        except psutil.NoSuchProcess:
+            pass
+    cmdline = info.get('cmdline') or []
+    if name.startswith('chromedriver'):
+        return keep_port is None or chromedriver_port(cmdline[1:]) != keep_port
+    # Procesos hijos (--type=renderer, gpu-process...) que quedaron sin su navegador
+    return any(flag in cmdline for flag in AUTOMATION_FLAGS) or any(arg.startswith('--type=') for arg in cmdline)
+
+def reap_orphans(chromedriver_url=''):
+    """Termina los chromedriver/Chrome huérfanos que dejó un proceso anterior o un driver que falló"""
+    keep_port = service_port(chromedriver_url)
+    try:
+        username = psutil.Process().username()
+    except (psutil.Error, KeyError) as e:
+        logger.warning(f"Cannot determine current user, skipping orphan reaping: {str(e)}")
+        return 0
+    
+    victims = []
+    for proc in psutil.process_iter(['pid', 'name', 'ppid', 'cmdline', 'username']):
+        try:
+            if proc.pid != os.getpid() and is_orphan_browser_process(proc, username, keep_port):
+                victims.extend(process_tree(proc.pid))
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    
+    victims = list({proc.pid: proc for proc in victims}.values())
+    if victims:
+        logger.warning(f"Reaping {len(victims)} orphaned browser processes: "
+                       f"{', '.join(str(proc.pid) for proc in victims[:10])}")
+        kill_processes(victims)
+    return len(victims)
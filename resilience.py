@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+def state_file(var, filename):
+    """Ruta de un archivo de estado: la de var o, con varios nodos (LEASE_DIR), una compartida por todos"""
+    path = os.getenv(var)
+    if path is not None:
+        return path
+    lease_dir = os.getenv('LEASE_DIR', '')
+    return os.path.join(lease_dir, filename) if lease_dir else filename
+
+@contextmanager
+def file_lock(path):
+    """Lock exclusivo entre procesos (y entre nodos si path está en LEASE_DIR) sobre path + '.lock'"""
+    try:
+        import fcntl
+    except ImportError:
+        # Sin fcntl (Windows) alcanza con el lock del proceso: ahí no se usa LEASE_DIR
+        fcntl = None
+    if not path or fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+    """Corta los intentos de login tras fallas repetidas; el estado se guarda en disco por cuenta"""
+    
+    def __init__(self, state_path='', failure_threshold=3, reset_timeout=3600):
+        self.state_path = state_path
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        # Sin archivo de estado el circuito vive solo en memoria
+        self._memory = {}
+    
+    def allow(self, key):
+        """True si se puede intentar; pasado reset_timeout se permite un intento de prueba"""
+        with self._lock, file_lock(self.state_path):
+            entry = self._load().get(key)
+        if not entry or entry['failures'] < self.failure_threshold:
+            return True
+        return time.time() - entry['opened_at'] >= self.reset_timeout
+    
+    def retry_after(self, key):
+        with self._lock, file_lock(self.state_path):
+            entry = self._load().get(key)
+        if not entry:
+            return 0
+        return max(0, entry['opened_at'] + self.reset_timeout - time.time())
+    
+    def record_success(self, key):
+        with self._lock, file_lock(self.state_path):
+            state = self._load()
+            if state.pop(key, None) is not None:
+                self._save(state)
+                logger.info(f"Login circuit for '{key}' closed")
+    
+    def record_failure(self, key):
+        # Leer, sumar y guardar bajo el lock: con varios nodos todos comparten el mismo presupuesto de fallas
+        with self._lock, file_lock(self.state_path):
+            state = self._load()
+            entry = state.setdefault(key, {'failures': 0, 'opened_at': 0})
+            entry['failures'] += 1
+            if entry['failures'] >= self.failure_threshold:
+                # Cada falla con el circuito abierto (o en el intento de prueba) reinicia la espera
+                entry['opened_at'] = time.time()
+                logger.error(f"Login circuit for '{key}' open after {entry['failures']} consecutive failures; "
+                             f"pausing logins for {self.reset_timeout:.0f}s to avoid an account lockout")
+            self._save(state)
+    
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return self._memory
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable circuit state {self.state_path}: {str(e)}")
+            return {}
+    
+    def _save(self, state):
+        if not self.state_path:
+            self._memory = state
+            return
+        tmp_path = f"{self.state_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+_login_breaker = None
+_login_breaker_lock = threading.Lock()
+
+def get_login_breaker():
+    global _login_breaker
+    with _login_breaker_lock:
+        if _login_breaker is None:
+            _login_breaker = CircuitBreaker(
+                state_path=state_file('CIRCUIT_STATE_FILE', 'circuit_state.json'),
+                failure_threshold=int(os.getenv('LOGIN_FAILURE_THRESHOLD', '3')),
+                reset_timeout=float(os.getenv('LOGIN_CIRCUIT_RESET', '3600')),
+            )
+    return _login_breaker
@@ -0,0 +1,129 @@
+import os
+import math
+import time
+import random
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+def parse_field(field, low, high):
+    """Campo estilo cron ('*', '1-5', '0,6', '9-17') -> conjunto de valores"""
+    if field == '*':
+        return set(range(low, high + 1))
+    values = set()
+    for part in field.split(','):
+        if '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end:
+            raise ValueError(f"Invalid schedule field '{field}' (expected {low}-{high})")
+        values.update(range(start, end + 1))
+    return values
+
+def parse_windows(spec):
+    """'1-5 9-17=600; * *=3600' -> [(días, horas, intervalo)], días 0=domingo como en cron"""
+    windows = []
+    for entry in filter(None, (e.strip() for e in (spec or '').split(';'))):
+        fields, _, interval = entry.partition('=')
+        try:
+            days, hours = fields.split()
+            seconds = float(interval)
+            # Un intervalo nulo o negativo dejaría a next_run buscando el próximo turno para siempre
+            if not 0 < seconds < math.inf:
+                raise ValueError(f"interval must be a positive number of seconds, got '{interval}'")
+            windows.append((parse_field(days, 0, 6), parse_field(hours, 0, 23), seconds))
+        except ValueError as e:
+            raise ValueError(f"Invalid POLL_WINDOWS entry '{entry}': {str(e)}")
+    return windows
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Backoff exponencial con tope y jitter para el intento N (desde 1)"""
+    base = float(os.getenv('RETRY_BASE_DELAY', '20')) if base is None else base
+    cap = float(os.getenv('RETRY_MAX_DELAY', '300')) if cap is None else cap
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+class PollScheduler:
+    """Calcula el próximo ciclo a ritmo fijo según ventanas horarias, con jitter y estiramiento por inactividad"""
+    
+    def __init__(self, default_interval=1800, windows=None, jitter=0.1,
+                 idle_cycles=0, idle_factor=2, idle_max_factor=4):
+        self.default_interval = default_interval
+        self.windows = windows or []
+        self.jitter = jitter
+        self.idle_cycles = idle_cycles
+        self.idle_factor = idle_factor
+        self.idle_max_factor = idle_max_factor
+        self.unchanged_cycles = 0
+        self._last_signature = None
+        self._anchor = None
+    
+    @classmethod
+    def from_config(cls, config):
+        scheduler = cls()
+        scheduler.reconfigure(config)
+        return scheduler
+    
+    def reconfigure(self, config):
+        """Aplica una configuración nueva conservando el ancla y el contador de ciclos sin cambios"""
+        self.default_interval = config.poll_interval
+        self.windows = list(config.poll_windows)
+        self.jitter = config.poll_jitter
+        self.idle_cycles = config.idle_cycles
+        self.idle_factor = config.idle_factor
+        self.idle_max_factor = config.idle_max_factor
+    
+    def base_interval(self, when):
+        dt = datetime.fromtimestamp(when)
+        weekday = dt.isoweekday() % 7  # cron: 0 = domingo
+        for days, hours, interval in self.windows:
+            if weekday in days and dt.hour in hours:
+                return interval
+        return self.default_interval
+    
+    def idle_multiplier(self):
+        if not self.idle_cycles or self.unchanged_cycles < self.idle_cycles:
+            return 1
+        steps = self.unchanged_cycles - self.idle_cycles + 1
+        return min(self.idle_max_factor, self.idle_factor ** steps)
+    
+    def interval(self, when):
+        return self.base_interval(when) * self.idle_multiplier()
+    
+    def observe(self, signature):
+        """Registra el resultado del ciclo (p. ej. los totales); None indica un ciclo fallido"""
+        if signature is None:
+            return
+        if signature == self._last_signature:
+            self.unchanged_cycles += 1
+        else:
+            self.unchanged_cycles = 0
+        self._last_signature = signature
+    
+    def next_run(self, now=None):
+        """Próximo ciclo a ritmo fijo: se ancla al horario previsto, no al fin del ciclo anterior"""
+        now = time.time() if now is None else now
+        if self._anchor is None:
+            self._anchor = now
+        
+        anchor = self._anchor + self.interval(self._anchor)
+        # Si un ciclo se demoró más que el intervalo se saltean los turnos perdidos
+        while anchor <= now:
+            anchor += self.interval(anchor)
+        self._anchor = anchor
+        
+        interval = self.interval(anchor)
+        jittered = anchor + random.uniform(-self.jitter, self.jitter) * interval
+        return max(now, jittered)
+    
+    def describe(self):
+        parts = [f"intervalo por defecto {self.default_interval:.0f}s"]
+        if self.windows:
+            parts.append(f"{len(self.windows)} ventanas horarias")
+        if self.jitter:
+            parts.append(f"jitter ±{self.jitter:.0%}")
+        if self.idle_cycles:
+            parts.append(f"x{self.idle_factor:g} tras {self.idle_cycles} ciclos sin cambios (máx x{self.idle_max_factor:g})")
+        return ', '.join(parts)
@@ -0,0 +1,69 @@
+import sys
+import time
+import builtins
+
+class StartupProfiler:
+    """Mide el costo de cada import y de las etapas de arranque (--profile-startup)"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.checkpoints = []
+        self.imports = {}
+        self._stack = []
+        self._original_import = None
+    
+    def install(self):
+        if self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+    
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+    
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        root = name.partition('.')[0]
+        # Solo se mide la primera carga de cada paquete, incluyendo lo que importe a su vez
+        if level or self._stack or root in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        
+        self._stack.append(root)
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            if not self._stack:
+                self.imports[root] = self.imports.get(root, 0) + elapsed
+    
+    def mark(self, label):
+        self.checkpoints.append((label, time.perf_counter()))
+    
+    def report(self, output=None, top=15, phases=None):
+        output = output or sys.stderr
+        total = time.perf_counter() - self.started
+        output.write(f"\n=== Startup profile ({total * 1000:.0f} ms total) ===\n")
+        
+        output.write("Imports (first load of each top-level package, inclusive):\n")
+        ranked = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+        for name, elapsed in ranked[:top]:
+            output.write(f"  {name:<28}{elapsed * 1000:>9.1f} ms\n")
+        if len(ranked) > top:
+            rest = sum(elapsed for _, elapsed in ranked[top:])
+            output.write(f"  {f'({len(ranked) - top} more)':<28}{rest * 1000:>9.1f} ms\n")
+        
+        output.write("Stages:\n")
+        previous = self.started
+        for label, at in self.checkpoints:
+            output.write(f"  {label:<28}{(at - previous) * 1000:>9.1f} ms\n")
+            previous = at
+        
+        if phases:
+            output.write("Check phases:\n")
+            for label, elapsed in phases:
+                output.write(f"  {label:<28}{elapsed * 1000:>9.1f} ms\n")
+
+profiler = StartupProfiler()
@@ -42,12 +42,16 @@ def test_email_notification():
         msg.attach(MIMEText(body, 'plain'))
         
         # Enviar email
-        logger.info("Connecting to Gmail SMTP server...")
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
+        smtp_host = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        smtp_port = int(os.getenv('SMTP_PORT', '587'))
+        logger.info(f"Connecting to SMTP server {smtp_host}:{smtp_port}...")
+        server = smtplib.SMTP(smtp_host, smtp_port)
+        if os.getenv('SMTP_STARTTLS', 'true').lower() == 'true':
+            server.starttls()
         
-        logger.info("Logging in to Gmail...")
-        server.login(email_from, email_password)
+        if email_password:
+            logger.info("Logging in to SMTP server...")
+            server.login(email_from, email_password)
         
         logger.info("Sending email...")
         server.send_message(msg)
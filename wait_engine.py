@@ -0,0 +1,150 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+class SelectorNotFound(Exception):
+    def __init__(self, step, description, timeout):
+        super().__init__(f"Selector not found: {description} (step '{step}', waited {timeout:.1f}s)")
+        self.step = step
+        self.description = description
+        self.timeout = timeout
+
+class WaitEngine:
+    """Esperas explícitas con timeouts por paso aprendidos de las latencias registradas (p99 x margen)"""
+    
+    def __init__(self, stats_path='', margin=2.0, min_timeout=2.0, max_timeout=20.0,
+                 min_samples=10, window=200, poll_frequency=0.1):
+        self.stats_path = stats_path
+        self.margin = margin
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.window = window
+        self.poll_frequency = poll_frequency
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._misses = {}
+        # Timeouts seguidos por paso: cada uno duplica el timeout aprendido hasta que el paso vuelve a andar
+        self._miss_streaks = {}
+        self._load()
+    
+    def timeout_for(self, step, default_timeout, navigation=False):
+        """Timeout por defecto hasta tener suficientes muestras; luego p99 x margen acotado
+        
+        Los timeouts cuentan como muestras censuradas (al menos el timeout usado) y cada uno seguido
+        duplica el valor, así que si el portal se vuelve más lento el timeout crece hasta max_timeout
+        en lugar de fallar para siempre. En los pasos de navegación (navigation=True) nunca se
+        aprende un valor menor que default_timeout: un login lento no debe confundirse con uno roto.
+        """
+        with self._lock:
+            samples = sorted(self._latencies.get(step, ()))
+            streak = self._miss_streaks.get(step, 0)
+        if len(samples) < self.min_samples:
+            timeout = default_timeout
+        else:
+            p99 = samples[max(0, math.ceil(0.99 * len(samples)) - 1)]
+            timeout = max(self.min_timeout, p99 * self.margin)
+            if navigation:
+                timeout = max(timeout, default_timeout)
+        return min(max(self.max_timeout, default_timeout), timeout * 2 ** min(streak, 10))
+    
+    def until(self, driver, step, condition, description, default_timeout=10, navigation=False):
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        
+        timeout = self.timeout_for(step, default_timeout, navigation)
+        started = time.monotonic()
+        try:
+            result = WebDriverWait(driver, timeout, poll_frequency=self.poll_frequency).until(condition)
+        except TimeoutException:
+            with self._lock:
+                self._misses[step] = self._misses.get(step, 0) + 1
+                self._miss_streaks[step] = self._miss_streaks.get(step, 0) + 1
+                # Muestra censurada: el paso tardó al menos lo que se esperó
+                self._latencies.setdefault(step, deque(maxlen=self.window)).append(timeout)
+            get_metrics().inc('selector_not_found_total', step=step)
+            raise SelectorNotFound(step, description, timeout) from None
+        
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._latencies.setdefault(step, deque(maxlen=self.window)).append(elapsed)
+            self._miss_streaks.pop(step, None)
+        return result
+    
+    def element(self, driver, step, locator, default_timeout=10, clickable=False):
+        """Espera un elemento por (By, valor); con clickable=True además visible y habilitado"""
+        from selenium.webdriver.support import expected_conditions as EC
+        
+        condition = EC.element_to_be_clickable(locator) if clickable else EC.presence_of_element_located(locator)
+        by, value = locator
+        return self.until(driver, step, condition, f"{by}={value}", default_timeout)
+    
+    def summary(self):
+        with self._lock:
+            steps = sorted(set(self._latencies) | set(self._misses))
+            latencies = {step: sorted(self._latencies.get(step, ())) for step in steps}
+            misses = dict(self._misses)
+        summary = {}
+        for step in steps:
+            samples = latencies[step]
+            summary[step] = {
+                'samples': len(samples),
+                'misses': misses.get(step, 0),
+                'p50': samples[len(samples) // 2] if samples else None,
+                'p99': samples[max(0, math.ceil(0.99 * len(samples)) - 1)] if samples else None,
+            }
+        return summary
+    
+    def save(self):
+        if not self.stats_path:
+            return
+        with self._lock:
+            data = {
+                'latencies': {step: list(samples) for step, samples in self._latencies.items()},
+                'misses': dict(self._misses),
+                'miss_streaks': dict(self._miss_streaks),
+            }
+        tmp_path = self.stats_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            logger.warning(f"Could not save wait statistics: {str(e)}")
+    
+    def _load(self):
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable wait statistics {self.stats_path}: {str(e)}")
+            return
+        for step, samples in data.get('latencies', {}).items():
+            self._latencies[step] = deque(samples, maxlen=self.window)
+        self._misses = data.get('misses', {})
+        self._miss_streaks = data.get('miss_streaks', {})
+
+_wait_engine = None
+_wait_engine_lock = threading.Lock()
+
+def get_wait_engine():
+    global _wait_engine
+    with _wait_engine_lock:
+        if _wait_engine is None:
+            _wait_engine = WaitEngine(
+                stats_path=os.getenv('WAIT_STATS_FILE', 'wait_stats.json'),
+                margin=float(os.getenv('WAIT_MARGIN', '2.0')),
+                min_timeout=float(os.getenv('WAIT_MIN_TIMEOUT', '2')),
+                max_timeout=float(os.getenv('WAIT_MAX_TIMEOUT', '20')),
+            )
+    return _wait_engine